@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_bench.py
+Time vls460_print end to end on synthetic documents, without a printer.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+Run it with the Inkscape extensions on the PYTHONPATH (see inkex.cmd), e.g.:
+    inkex.cmd python benchmarks\\vls460_bench.py --sizes 1000,10000
+The GDI calls go to the in-memory RecordingBackend, so this runs on any platform.
+Use --json to save the results and --compare to check them against a previous run.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from optparse import OptionParser
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'extensions'))
+# local library
+from vls460_print import Vls460Printer
+
+PEN_COLORS = ['#000000', '#ff0000', '#00ff00', '#ffff00', '#0000ff', '#ff00ff', '#00ffff', '#ff6600']
+
+SVG_HEADER = '''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+   xmlns:xlink="http://www.w3.org/1999/xlink"
+   xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+   width="600mm" height="450mm" viewBox="0 0 600 450"
+   sodipodi:docname="{name}">
+'''
+
+def write_svg(filename, count, seed=0):
+    # count shapes spread over the bed, in layers of 1000 shapes:
+    # a mix of cubic paths, polylines and rectangles, cut (stroke) or engraved (fill)
+    rnd = random.Random(seed)
+    with open(filename, 'w') as fh:
+        fh.write(SVG_HEADER.format(name=os.path.basename(filename)))
+        for i in range(count):
+            if i % 1000 == 0:
+                if i:
+                    fh.write('</g>\n')
+                fh.write('<g inkscape:groupmode="layer" id="layer{}" transform="translate({:.3f},{:.3f})">\n'
+                    .format(i // 1000, rnd.uniform(0, 5), rnd.uniform(0, 5)))
+            x, y = rnd.uniform(0, 580), rnd.uniform(0, 430)
+            w, h = rnd.uniform(1, 15), rnd.uniform(1, 15)
+            color = PEN_COLORS[i % len(PEN_COLORS)]
+            if i % 5 == 4:
+                style = 'fill:{};stroke:none'.format(color)
+            else:
+                style = 'fill:none;stroke:{};stroke-width:0.1'.format(color)
+            if i % 3 == 0:
+                fh.write('<rect id="r{}" x="{:.3f}" y="{:.3f}" width="{:.3f}" height="{:.3f}" style="{}"/>\n'
+                    .format(i, x, y, w, h, style))
+            elif i % 3 == 1:
+                fh.write('<path id="p{}" d="M {:.3f},{:.3f} C {:.3f},{:.3f} {:.3f},{:.3f} {:.3f},{:.3f} '
+                    'S {:.3f},{:.3f} {:.3f},{:.3f} Z" style="{}"/>\n'.format(
+                    i, x, y, x + w, y, x + w, y + h / 2, x + w / 2, y + h / 2,
+                    x, y + h, x + w, y + h, style))
+            else:
+                fh.write('<path id="p{}" d="M {:.3f},{:.3f} L {:.3f},{:.3f} {:.3f},{:.3f} {:.3f},{:.3f}" style="{}"/>\n'
+                    .format(i, x, y, x + w, y, x + w / 2, y + h, x, y + h / 2, style))
+        if count:
+            fh.write('</g>\n')
+        fh.write('</svg>\n')
+
+def run_once(filename, extra_args):
+    # same steps as inkex.Effect.affect(), timed separately
+    args = ['--backend=record'] + extra_args + [filename]
+    e = Vls460Printer()
+    e.svg_file = filename
+    e.getoptions(args)
+    t0 = time.time()
+    e.parse()
+    e.getposinlayer()
+    e.getselected()
+    e.getdocids()
+    t1 = time.time()
+    e.effect()
+    t2 = time.time()
+    counts = e.printer.backend.counts
+    return {
+        'parse': t1 - t0,
+        'effect': t2 - t1,
+        'gdi_calls': sum(counts.values()),
+        'counts': counts,
+    }
+
+def main():
+    optionParser = OptionParser(usage='usage: %prog [options] [-- vls460_print options]')
+    optionParser.add_option(
+        '--sizes', action='store', type='string',
+        dest='sizes', default='1000,10000,100000,1000000',
+        help='Comma separated numbers of paths')
+    optionParser.add_option(
+        '--repeat', action='store', type='int',
+        dest='repeat', default=1, help='Runs per size, the best one is kept')
+    optionParser.add_option(
+        '--seed', action='store', type='int',
+        dest='seed', default=0, help='Random seed of the generated documents')
+    optionParser.add_option(
+        '--keep', action='store', type='string',
+        dest='keep', default=None, help='Keep the generated SVG files in this directory')
+    optionParser.add_option(
+        '--json', action='store', type='string',
+        dest='json', default=None, help='Save the results to this JSON file')
+    optionParser.add_option(
+        '--compare', action='store', type='string',
+        dest='compare', default=None, help='Compare with the results of a previous --json run')
+    optionParser.add_option(
+        '--tolerance', action='store', type='float',
+        dest='tolerance', default=10.0, help='Slowdown in percent reported as a regression')
+    options, args = optionParser.parse_args()
+
+    workdir = options.keep or tempfile.mkdtemp(prefix='vls460_bench')
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    previous = {}
+    if options.compare:
+        with open(options.compare) as fh:
+            previous = json.load(fh)
+
+    results = {}
+    regressions = 0
+    print('{:>9} | {:>8} | {:>9} | {:>10} | {:>9}'.format('paths', 'parse s', 'effect s', 'GDI calls', 'paths/s'))
+    print('-' * 58)
+    try:
+        for size in [int(s) for s in options.sizes.split(',') if s]:
+            filename = os.path.join(workdir, 'bench_{}.svg'.format(size))
+            if not os.path.exists(filename):
+                write_svg(filename, size, options.seed)
+            best = None
+            for i in range(options.repeat):
+                r = run_once(filename, args)
+                if best is None or r['parse'] + r['effect'] < best['parse'] + best['effect']:
+                    best = r
+            results[str(size)] = best
+            total = best['parse'] + best['effect']
+            line = '{:9d} | {:8.3f} | {:9.3f} | {:10d} | {:9.0f}'.format(
+                size, best['parse'], best['effect'], best['gdi_calls'], size / total if total else 0)
+            old = previous.get(str(size))
+            if old:
+                old_total = old['parse'] + old['effect']
+                change = 100.0 * (total - old_total) / old_total if old_total else 0
+                line += ' | {:+.1f}%'.format(change)
+                if change > options.tolerance:
+                    line += ' REGRESSION'
+                    regressions += 1
+            print(line)
+            sys.stdout.flush()
+    finally:
+        if not options.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if options.json:
+        with open(options.json, 'w') as fh:
+            json.dump(results, fh, indent=1, sort_keys=True)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
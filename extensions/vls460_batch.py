@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_batch.py
+Group the prepared paths of a document by pen color, and the fills by runs of
+a same color, before they are sent to the printer, see GdiPrinter.draw_paths().
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import OrderedDict
+
+class ColorBatch():
+    # The ULS driver maps each stroke color to a pen and cuts the vectors
+    # after the raster engraving, so the strokes are grouped by (color,
+    # stroke width) whatever their order, each group keeping the document
+    # order. The fills are engraved as they overlap: they stay in document
+    # order, only the runs of a same fill color next to each other are
+    # grouped, and they are all drawn before the strokes.
+    # Each of the passes, prepare(paths, (color, stroke, fillcolor)), may
+    # rework the paths of a group before it is drawn.
+    # A shape added with a tracked entry, see track(), is given to sent(entry)
+    # once the last of its groups is drawn.
+    # flush() may be called several times, e.g. once per layer.
+
+    def __init__(self):
+        self.groups = OrderedDict() # stroke key -> paths
+        self.entries = {} # stroke key -> tracked entries of the shapes of the group
+        self.fills = [] # [key, paths, tracked entries] of the runs of fills
+        self.passes = []
+        self.sent = None
+        self.paths = 0 # added since the last flush
+
+    def __len__(self):
+        return len(self.groups) + len(self.fills)
+
+    def track(self, entry):
+        # [entry, groups of the shape not drawn yet]
+        return [entry, 0]
+
+    def add(self, p, color=None, stroke=1, fillcolor=None, entry=None):
+        self.paths += 1
+        if fillcolor is not None:
+            self.fill((None, 1, fillcolor), entry).append(p)
+        if color is not None:
+            self.group((color, stroke, None), entry).append(p)
+
+    def group(self, key, entry=None):
+        paths = self.groups.get(key)
+        if paths is None:
+            paths = self.groups[key] = []
+        if entry is not None:
+            entry[1] += 1
+            self.entries.setdefault(key, []).append(entry)
+        return paths
+
+    def fill(self, key, entry=None):
+        if not self.fills or self.fills[-1][0] != key:
+            self.fills.append([key, [], []])
+        run = self.fills[-1]
+        if entry is not None:
+            entry[1] += 1
+            run[2].append(entry)
+        return run[1]
+
+    def flush(self, printer):
+        for key, paths, entries in self.fills:
+            self.draw(printer, key, paths, entries)
+        for key, paths in self.groups.items():
+            self.draw(printer, key, paths, self.entries.pop(key, ()))
+        self.groups.clear()
+        del self.fills[:]
+        self.paths = 0
+
+    def draw(self, printer, key, paths, entries):
+        for prepare in self.passes:
+            paths = prepare(paths, key)
+        color, stroke, fillcolor = key
+        printer.draw_paths(paths, color, stroke, fillcolor)
+        for entry in entries:
+            entry[1] -= 1
+            if entry[1] == 0 and self.sent is not None:
+                self.sent(entry[0])
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
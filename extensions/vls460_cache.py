@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_cache.py
+Keep the prepared paths on disk, to send a document again without parsing
+and transforming its shapes again.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+A cache directory holds two files:
+    geometry.pack   the CompactPath of each entry, one after the other:
+                    a '<III' header (number of coords, kinds and counts)
+                    then the coords (double), kinds (int8) and counts (int32),
+                    in the native byte order
+    geometry.idx    INDEX_MAGIC then for each entry its key (SHA-1 of the
+                    shape, its matrix and the options), offset, length and
+                    the last run that used it
+The pack is memory mapped for reading, new entries are appended to it. When it
+grows over the size limit, the entries least recently used are dropped.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from array import array
+import hashlib
+import mmap
+import os
+import struct
+# local library
+from vls460_path import CompactPath
+from vls460_util import replace
+
+INDEX_MAGIC = b'VLS460C1'
+INDEX_ENTRY = struct.Struct('<20sQII') # key, offset, length, run
+RECORD_HEADER = struct.Struct('<III')
+
+def shape_key(shape, mat, salt):
+    # shape is a work item of vls460_prepare, salt the scale and options
+    return hashlib.sha1(repr((shape, mat, salt)).encode('utf-8')).digest()
+
+def encode(p):
+    counts = array('i', p.counts)
+    return RECORD_HEADER.pack(len(p.coords), len(p.kinds), len(counts)) \
+        + p.coords.tostring() + p.kinds.tostring() + counts.tostring()
+
+def decode(buf, offset):
+    ncoords, nkinds, ncounts = RECORD_HEADER.unpack_from(buf, offset)
+    start = offset + RECORD_HEADER.size
+    coords = array('d')
+    coords.fromstring(buf[start:start + 8*ncoords])
+    start += 8*ncoords
+    kinds = array('b')
+    kinds.fromstring(buf[start:start + nkinds])
+    start += nkinds
+    counts = array('i')
+    counts.fromstring(buf[start:start + 4*ncounts])
+    return CompactPath(coords, kinds, array('l', counts))
+
+class GeometryCache():
+
+    def __init__(self, directory, size):
+        self.size = size # bytes
+        self.pack_name = os.path.join(directory, 'geometry.pack')
+        self.index_name = os.path.join(directory, 'geometry.idx')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.index = {} # key -> [offset, length, run]
+        self.written = set() # keys appended in this run
+        self.hits = 0
+        self.misses = 0
+        self.run = 1 + self.read_index()
+        self.pack = open(self.pack_name, 'ab+' if self.index else 'wb+')
+        self.pack.seek(0, 2)
+        self.end = self.pack.tell()
+        self.mapped = self.end
+        self.map = None
+        if self.mapped:
+            self.map = mmap.mmap(self.pack.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_index(self):
+        # the last run, 0 without a valid index
+        try:
+            with open(self.index_name, 'rb') as fh:
+                data = fh.read()
+            packed = os.path.getsize(self.pack_name)
+        except (IOError, OSError):
+            return 0
+        if not data.startswith(INDEX_MAGIC):
+            return 0
+        last = 0
+        for i in range(len(INDEX_MAGIC), len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+            key, offset, length, run = INDEX_ENTRY.unpack_from(data, i)
+            if offset + length <= packed:
+                self.index[key] = [offset, length, run]
+                last = max(last, run)
+        return last
+
+    def write_index(self):
+        with open(self.index_name + '.tmp', 'wb') as fh:
+            fh.write(INDEX_MAGIC)
+            for key, (offset, length, run) in self.index.items():
+                fh.write(INDEX_ENTRY.pack(key, offset, length, run))
+        replace(self.index_name + '.tmp', self.index_name)
+
+    def get(self, key):
+        entry = self.index.get(key)
+        if entry is None or entry[0] + entry[1] > self.mapped:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[2] = self.run
+        return decode(self.map, entry[0])
+
+    def put(self, key, p):
+        # a shape met again before the end of the run is not mapped yet
+        if key in self.written:
+            return
+        self.written.add(key)
+        data = encode(p)
+        self.pack.write(data)
+        self.index[key] = [self.end, len(data), self.run]
+        self.end += len(data)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.pack.close()
+        if self.end > self.size:
+            self.evict()
+        self.write_index()
+
+    def evict(self):
+        # keep the entries used last, down to 3/4 of the size limit
+        budget = self.size * 3 // 4
+        entries = sorted(self.index.items(), key=lambda e: e[1][2], reverse=True)
+        index = {}
+        offset = 0
+        with open(self.pack_name, 'rb') as src:
+            with open(self.pack_name + '.tmp', 'wb') as dst:
+                for key, (start, length, run) in entries:
+                    if offset + length > budget:
+                        break
+                    src.seek(start)
+                    dst.write(src.read(length))
+                    index[key] = [offset, length, run]
+                    offset += length
+        replace(self.pack_name + '.tmp', self.pack_name)
+        self.index = index
+        self.end = offset
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
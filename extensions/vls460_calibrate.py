@@ -26,6 +26,7 @@ from optparse import OptionParser
 import sys
 # local library
 from vls460_gdi import GdiPrinter, errormsg
+from vls460_profile import PrinterProfile
 
 LASER_TEMPLATE="""[VLS4.60]
 VectorPerformance=1 
@@ -140,6 +141,13 @@ class Vls460Calibrate():
         optionParser.add_option(
             '--file', action='store', type='string',
             dest='file', default="~\\Desktop\\calibration.las", help='Laser configuration file')
+        optionParser.add_option(
+            '--profile', action='store', type='string',
+            dest='profile', default='', help='Printer profile keeping the printer and laser settings')
+        optionParser.add_option(
+            '--printer-dialog', action='store', type='choice',
+            dest='printer_dialog', choices=['true', 'false'], default='false',
+            help='Show the printer properties dialog even when the profile has settings')
 
         self.OptionParser = optionParser
 
@@ -194,8 +202,15 @@ class Vls460Calibrate():
         with open(expanduser(output_las), 'w') as fh:
             fh.write(laser_config)
 
-        # Start GDI printing
-        self.printer = GdiPrinter()
+        # Start GDI printing, keep the settings in the profile if any
+        if options.profile:
+            profile = PrinterProfile(options.profile)
+            self.printer = GdiPrinter(devmode=profile.devmode, prompt=options.printer_dialog == 'true')
+            profile.devmode = self.printer.devmode
+            profile.las = laser_config
+            profile.save()
+        else:
+            self.printer = GdiPrinter()
 
         # Create GDI document
         self.printer.create_document('VLS460 {} p{:d}-{:d} v{:d}-{:d}'.format(
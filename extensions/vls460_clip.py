@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_clip.py
+Keep the drawing on the laser bed: shapes off the page are dropped, the
+outlines crossing its border are clipped to it.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+The boxes are the ones of the points of the paths, control points included
+(CompactPath.bounds), which hold the curves: a path whose box is off the page
+is dropped, one whose box is on it is kept as it is. Only the others are
+clipped, segment by segment: the lines by Liang-Barsky, the curves whose
+control points are all on the page are kept, the ones all off it dropped, and
+the ones in between flattened then clipped as lines. The fills are only
+dropped when off the page, GDI clips them to the page itself.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# local library
+from vls460_path import CompactPath, LINE, flatten_curve
+
+def read_page(text):
+    # (width, height) in millimeters of the PageWidth and PageHeight of .las
+    # settings, in tenths of a millimeter; None when they are missing
+    size = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.strip() in ('PageWidth', 'PageHeight'):
+            try:
+                size[key.strip()] = int(value) / 10.0
+            except ValueError:
+                pass
+    if size.get('PageWidth', 0) > 0 and size.get('PageHeight', 0) > 0:
+        return size['PageWidth'], size['PageHeight']
+    return None
+
+def overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def contains(a, b):
+    # box b is inside box a
+    return a[0] <= b[0] and b[2] <= a[2] and a[1] <= b[1] and b[3] <= a[3]
+
+def liang_barsky(x0, y0, x1, y1, box):
+    # (t0, t1) of the part of the segment in box, None if it is outside
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0 - box[0]), (dx, box[2] - x0), (-dy, y0 - box[1]), (dy, box[3] - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / float(p)
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    return t0, t1
+
+class Clipper():
+    # builds the clipped path one segment at a time
+
+    def __init__(self, box, tolerance):
+        self.box = box
+        self.tolerance = tolerance
+        self.path = CompactPath()
+        self.segments = None # of the subpath being built, None if there is none
+
+    def move(self, point):
+        self.end()
+        self.path.coords.extend(point)
+        self.segments = 0
+
+    def end(self):
+        if self.segments:
+            self.path.counts.append(self.segments)
+        elif self.segments == 0:
+            del self.path.coords[-2:]
+        self.segments = None
+
+    def line(self, a, b):
+        t = liang_barsky(a[0], a[1], b[0], b[1], self.box)
+        if t is None:
+            self.end()
+            return
+        t0, t1 = t
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        if self.segments is None or t0 > 0:
+            self.move((a[0] + t0*dx, a[1] + t0*dy))
+        self.path.coords.extend((a[0] + t1*dx, a[1] + t1*dy))
+        self.path.kinds.append(LINE)
+        self.segments += 1
+        if t1 < 1:
+            self.end()
+
+    def curve(self, p0, c1, c2, p1):
+        xs = (p0[0], c1[0], c2[0], p1[0])
+        ys = (p0[1], c1[1], c2[1], p1[1])
+        hull = (min(xs), min(ys), max(xs), max(ys))
+        if contains(self.box, hull):
+            if self.segments is None:
+                self.move(p0)
+            self.path.add_curve(c1, c2, p1)
+            self.segments += 1
+        elif not overlaps(self.box, hull):
+            self.end()
+        else:
+            for point in flatten_curve(p0, c1, c2, p1, self.tolerance):
+                self.line(p0, point)
+                p0 = point
+
+def clip_path(p, box, tolerance):
+    # the parts of p in box, as open subpaths; tolerance flattens the curves
+    # crossing the border
+    clipper = Clipper(box, tolerance)
+    c = p.coords
+    for start, points, first, count in p.subpaths():
+        i = 2*start
+        p0 = (c[i], c[i + 1])
+        for kind in p.kinds[first:first + count]:
+            if kind == LINE:
+                p1 = (c[i + 2], c[i + 3])
+                clipper.line(p0, p1)
+                i += 2
+            else:
+                p1 = (c[i + 6], c[i + 7])
+                clipper.curve(p0, (c[i + 2], c[i + 3]), (c[i + 4], c[i + 5]), p1)
+                i += 6
+            p0 = p1
+        clipper.end()
+    return clipper.path
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_daemon.py
+Print server: keeps the printer open with the settings of a profile, and
+prints the jobs compiled by vls460_print (see vls460_job) one after the other.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+Start it once, e.g.:
+    inkex.cmd vls460_daemon --profile wood
+then vls460_print with "Send to the print server" only compiles the job and
+queues it. The jobs come through a multiprocessing connection on localhost:
+    ('submit', filename, delete)  -> job id, the file is removed once printed
+                                     when delete is True
+    ('status', job id or None)    -> the status of the job, or of all of them
+    ('stop',)                     -> True, once the queued jobs are printed
+A status is a dict: id, file, name, state (queued, printing, done or failed),
+error, submitted and finished times. Only the job files of SPOOL_DIR are
+removed once printed.
+The connections are authenticated with a random key, created once in
+KEY_FILE and readable by its user only: multiprocessing unpickles the
+messages, so whoever has the key can run code in the daemon.
+Use --backend=record to run it without a printer, e.g. for tests.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+from optparse import OptionParser
+from os.path import expanduser
+import os
+import socket
+import tempfile
+import threading
+import time
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+# local library
+from vls460_gdi import GdiPrinter, RecordingBackend, errormsg
+from vls460_job import JobReader, replay
+from vls460_profile import PrinterProfile
+
+ADDRESS = ('localhost', 46046)
+KEY_FILE = os.path.join(expanduser('~'), '.vls460', 'daemon.key')
+KEY_SIZE = 32
+SPOOL_DIR = os.path.join(expanduser('~'), '.vls460', 'spool')
+MAX_FINISHED = 100 # status kept of the jobs done or failed
+
+def spool_file():
+    # a new job file name in SPOOL_DIR
+    if not os.path.isdir(SPOOL_DIR):
+        os.makedirs(SPOOL_DIR)
+    fd, filename = tempfile.mkstemp(suffix='.vlsjob', dir=SPOOL_DIR)
+    os.close(fd)
+    return filename
+
+def read_authkey(filename=KEY_FILE):
+    # the key of this user, created on first use
+    try:
+        with open(filename, 'rb') as fh:
+            key = fh.read()
+        if len(key) == KEY_SIZE:
+            return key
+    except IOError:
+        pass
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    if os.path.exists(filename):
+        os.remove(filename)
+    # O_EXCL: another process creating it at the same time fails here
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+    key = os.urandom(KEY_SIZE)
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(key)
+    return key
+
+def in_spool(filename):
+    spool = os.path.join(os.path.realpath(SPOOL_DIR), '')
+    return os.path.realpath(filename).startswith(spool)
+
+def request(message, address=ADDRESS, authkey=None):
+    # raises socket.error when the daemon is not running; multiprocessing's
+    # Client would retry for 20 s, a plain connection fails at once
+    if authkey is None:
+        authkey = read_authkey()
+    socket.create_connection(address, 1).close()
+    conn = Client(address, authkey=authkey)
+    try:
+        conn.send(message)
+        return conn.recv()
+    finally:
+        conn.close()
+
+def submit(filename, delete=True, address=ADDRESS, authkey=None):
+    return request(('submit', os.path.abspath(filename), delete), address, authkey)
+
+class PrintDaemon():
+
+    def __init__(self, printer, las=''):
+        self.printer = printer
+        self.devmode = printer.devmode # settings of the jobs without valid ones
+        self.las = las # where to write the .las settings of each job
+        self.jobs = OrderedDict() # id -> status
+        self.queue = Queue()
+        self.lock = threading.Lock()
+        self.last_id = 0
+
+    def submit(self, filename, delete=False):
+        with self.lock:
+            self.last_id += 1
+            self.jobs[self.last_id] = {
+                'id': self.last_id,
+                'file': filename,
+                'name': None,
+                'state': 'queued',
+                'error': None,
+                'submitted': time.time(),
+                'finished': None,
+                'delete': delete,
+            }
+        self.queue.put(self.last_id)
+        return self.last_id
+
+    def status(self, id=None):
+        with self.lock:
+            if id is not None:
+                job = self.jobs.get(id)
+                return dict(job) if job is not None else None
+            return [dict(job) for job in self.jobs.values()]
+
+    def update(self, job, **values):
+        with self.lock:
+            job.update(values)
+
+    def run(self):
+        # print the queued jobs, until None is queued
+        while True:
+            id = self.queue.get()
+            if id is None:
+                break
+            self.print_job(self.jobs[id])
+            self.forget()
+
+    def print_job(self, job):
+        self.update(job, state='printing')
+        reader = None
+        document = False
+        try:
+            reader = JobReader(job['file'])
+            self.update(job, name=reader.docname)
+            if self.las and reader.las:
+                with open(expanduser(self.las), 'wb') as fh:
+                    fh.write(reader.las)
+            if not self.printer.set_devmode(reader.devmode):
+                errormsg('Job {}: printer settings do not match the driver, using the profile ones'.format(job['id']))
+                self.printer.set_devmode(self.devmode)
+            document = True
+            self.printer.create_document(reader.docname)
+            replay(reader, self.printer)
+            document = False
+            self.printer.end_document()
+            self.update(job, state='done', finished=time.time())
+        except (Exception, SystemExit) as e:
+            if document:
+                # the next job starts on a clean DC
+                self.printer.abort_document()
+            self.update(job, state='failed', error=str(e) or e.__class__.__name__, finished=time.time())
+        finally:
+            if reader is not None:
+                reader.close()
+                # only a job of the spool, never any file sent by a client
+                if job['delete'] and in_spool(job['file']) and os.path.exists(job['file']):
+                    os.remove(job['file'])
+
+    def forget(self):
+        # drop the oldest finished jobs
+        with self.lock:
+            finished = [id for id, job in self.jobs.items() if job['state'] in ('done', 'failed')]
+            for id in finished[:-MAX_FINISHED]:
+                del self.jobs[id]
+
+    def handle(self, message):
+        # the reply to a message, and False to stop serving
+        if message[0] == 'submit':
+            return self.submit(message[1], message[2]), True
+        if message[0] == 'status':
+            return self.status(message[1] if len(message) > 1 else None), True
+        if message[0] == 'stop':
+            return True, False
+        return None, True
+
+    def serve(self, listener):
+        worker = threading.Thread(target=self.run)
+        worker.daemon = True
+        worker.start()
+        serving = True
+        while serving:
+            try:
+                conn = listener.accept()
+            except (EOFError, IOError):
+                continue # e.g. the connection test of request()
+            except Exception as e: # e.g. wrong authkey
+                errormsg('Connection refused: {}'.format(e))
+                continue
+            try:
+                reply, serving = self.handle(conn.recv())
+                conn.send(reply)
+            except (EOFError, IOError):
+                pass
+            finally:
+                conn.close()
+        listener.close()
+        self.queue.put(None)
+        worker.join()
+        self.printer.close_printer()
+
+def main():
+    optionParser = OptionParser(usage='usage: %prog [options]')
+    optionParser.add_option(
+        '--profile', action='store', type='string',
+        dest='profile', default='',
+        help='Printer profile, its settings are used when a job has none that fit')
+    optionParser.add_option(
+        '--backend', action='store', type='choice',
+        dest='backend', choices=['gdi', 'record'], default='gdi',
+        help='Send to the printer (gdi) or only record the GDI calls (record)')
+    optionParser.add_option(
+        '--las', action='store', type='string',
+        dest='las', default='',
+        help='Write the laser settings of each job to this .las file before printing it')
+    optionParser.add_option(
+        '--port', action='store', type='int',
+        dest='port', default=ADDRESS[1], help='Port on localhost')
+    optionParser.add_option(
+        '--status', action='store_true',
+        dest='status', default=False, help='Show the jobs of the running daemon')
+    optionParser.add_option(
+        '--submit', action='store', type='string',
+        dest='submit', default='', help='Queue this job file in the running daemon')
+    optionParser.add_option(
+        '--stop', action='store_true',
+        dest='stop', default=False, help='Stop the running daemon, once its jobs are printed')
+    options, args = optionParser.parse_args()
+    address = (ADDRESS[0], options.port)
+
+    if options.submit:
+        errormsg('Job {} queued'.format(submit(options.submit, False, address)))
+        return
+    if options.status:
+        for job in request(('status', None), address):
+            errormsg('{id:4d} {state:8} {name} {error}'.format(**job))
+        return
+    if options.stop:
+        request(('stop',), address)
+        return
+
+    devmode = None
+    if options.profile:
+        profile = PrinterProfile(options.profile)
+        devmode = profile.devmode
+    backend = RecordingBackend(log=False) if options.backend == 'record' else None
+    printer = GdiPrinter(backend, devmode)
+    if options.profile and printer.devmode != profile.devmode:
+        profile.devmode = printer.devmode
+        profile.save()
+    PrintDaemon(printer, options.las).serve(Listener(address, authkey=read_authkey()))
+
+if __name__ == '__main__':
+    main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_dedup.py
+Remove the segments cut twice, e.g. the edges shared by tiled parts.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+The paths are CompactPaths in printer pixels, read in place. Every segment is
+looked up in a SegmentIndex by its points snapped to whole pixels: curves are
+dropped when the same curve, in either direction, was already cut; straight
+segments are hashed by their supporting line, and only the parts of them not
+covered by the previous segments of that line are kept. The segments kept
+keep their own points, only the keys are snapped; the whole subpaths are
+copied as they are, and the ellipses GDI draws as such kept whole.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from bisect import bisect_left
+from math import hypot
+# local library
+from vls460_path import CompactPath, EllipsePath, LINE, Subpath
+
+def gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+def snap(c):
+    return (int(round(c[0])), int(round(c[1])))
+
+def lerp(a, b, r):
+    if r == 0:
+        return tuple(a)
+    if r == 1:
+        return tuple(b)
+    return (a[0] + r * (b[0] - a[0]), a[1] + r * (b[1] - a[1]))
+
+def segment_length(p0, c1, c2, p1):
+    # straight length, or the mean of the chord and the control polygon for a curve
+    chord = hypot(p1[0] - p0[0], p1[1] - p0[1])
+    if c1 == p0 and c2 == p1:
+        return chord
+    hull = hypot(c1[0] - p0[0], c1[1] - p0[1]) \
+        + hypot(c2[0] - c1[0], c2[1] - c1[1]) \
+        + hypot(p1[0] - c2[0], p1[1] - c2[1])
+    return (chord + hull) / 2
+
+class SegmentIndex():
+
+    def __init__(self):
+        self.curves = set()
+        self.lines = {} # (a, b, c) of a*x + b*y = c -> sorted disjoint [t0, t1] already cut
+
+    def add_curve(self, p0, c1, c2, p1):
+        # False if this curve was already cut
+        key = min((p0, c1, c2, p1), (p1, c2, c1, p0))
+        if key in self.curves:
+            return False
+        self.curves.add(key)
+        return True
+
+    def add_line(self, p0, p1):
+        # parts of the segment p0-p1 (snapped points) not cut yet, as (start,
+        # end) fractions of the way from p0 to p1
+        a, b = p1[1] - p0[1], p0[0] - p1[0]
+        g = gcd(abs(a), abs(b))
+        a, b = a // g, b // g
+        if a < 0 or (a == 0 and b < 0):
+            a, b = -a, -b
+        key = (a, b, a*p0[0] + b*p0[1])
+        # abscissa along the line
+        t0 = -b*p0[0] + a*p0[1]
+        t1 = -b*p1[0] + a*p1[1]
+        lo, hi = min(t0, t1), max(t0, t1)
+
+        cut = self.lines.setdefault(key, [])
+        i = bisect_left(cut, [lo, lo])
+        if i and cut[i - 1][1] >= lo:
+            i -= 1
+        j = i
+        free = []
+        start = lo
+        while j < len(cut) and cut[j][0] <= hi:
+            if cut[j][0] > start:
+                free.append((start, cut[j][0]))
+            start = max(start, cut[j][1])
+            j += 1
+        if start < hi:
+            free.append((start, hi))
+        # merge into the cut intervals
+        if j > i:
+            lo, hi = min(lo, cut[i][0]), max(hi, cut[j - 1][1])
+        cut[i:j] = [[lo, hi]]
+
+        def fraction(t):
+            return float(t - t0) / (t1 - t0)
+        if t0 > t1:
+            free = [(e, s) for s, e in reversed(free)]
+        return [(fraction(s), fraction(e)) for s, e in free]
+
+class Pieces():
+    # the segments left, joined back into subpaths
+
+    def __init__(self):
+        self.path = CompactPath()
+        self.segments = None # of the subpath being built
+        self.last = None # its end point
+
+    def add(self, kind, p0, c1, c2, p1):
+        path = self.path
+        if self.segments is None or self.last != p0:
+            self.end()
+            path.coords.extend(p0)
+            self.segments = 0
+        if kind == LINE:
+            path.coords.extend(p1)
+            path.kinds.append(LINE)
+        else:
+            path.add_curve(c1, c2, p1)
+        self.segments += 1
+        self.last = p1
+
+    def end(self):
+        if self.segments:
+            self.path.counts.append(self.segments)
+        self.segments = None
+
+def remove_duplicates(paths, index=None):
+    # returns the paths left, with the cut length removed in pixels
+    if index is None:
+        index = SegmentIndex()
+    result = []
+    pieces = Pieces()
+    saved = 0.0
+    for p in paths:
+        c = p.coords
+        for start, points, first, count in p.subpaths():
+            if not count:
+                continue
+            kept = []
+            whole = True
+            i = 2*start
+            p0 = (c[i], c[i + 1])
+            for kind in p.kinds[first:first + count]:
+                if kind == LINE:
+                    c1 = p0
+                    p1 = c2 = (c[i + 2], c[i + 3])
+                    i += 2
+                else:
+                    c1, c2, p1 = (c[i + 2], c[i + 3]), (c[i + 4], c[i + 5]), (c[i + 6], c[i + 7])
+                    i += 6
+                key = [snap(q) for q in (p0, c1, c2, p1)]
+                if key[0] == key[3] and key[1] == key[0] and key[2] == key[3]:
+                    whole = False # nothing to cut
+                elif kind == LINE:
+                    free = index.add_line(key[0], key[3])
+                    if free != [(0.0, 1.0)]:
+                        whole = False
+                        free = [(lerp(p0, p1, s), lerp(p0, p1, e)) for s, e in free]
+                        saved += segment_length(p0, c1, c2, p1) \
+                            - sum(segment_length(s, s, e, e) for s, e in free)
+                        kept.extend((LINE, s, s, e, e) for s, e in free)
+                    else:
+                        kept.append((LINE, p0, c1, c2, p1))
+                elif index.add_curve(*key):
+                    kept.append((kind, p0, c1, c2, p1))
+                else:
+                    whole = False
+                    saved += segment_length(p0, c1, c2, p1)
+                p0 = p1
+            if not whole:
+                for piece in kept:
+                    pieces.add(*piece)
+            elif isinstance(p, EllipsePath) and p.box is not None:
+                pieces.end()
+                if len(pieces.path):
+                    result.append(pieces.path)
+                    pieces.path = CompactPath()
+                result.append(p)
+            else:
+                pieces.end()
+                Subpath(p, start, points, first, count).append_to(pieces.path)
+    pieces.end()
+    if len(pieces.path):
+        result.append(pieces.path)
+    return result, saved
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_estimate.py
+Estimate how long the laser will run a job, from the prepared paths and the
+pen table of the .las settings (see LASER_TEMPLATE in vls460_calibrate).
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+JobEstimate stands for the printer, or in front of it, and measures what is
+drawn for each of the 8 pens (the nearest pen color):
+- vector: the cut length of the strokes, and the head moves between them,
+  from the origin, in the drawing order,
+- raster: the bands swept by the head, from the bounding boxes of the fills
+  (and of the strokes of raster only pens) and of the images (black pen)
+  merged along the scan lines.
+Then with PenSpeedsCips (per mille of MAX_SPEED), PenMode (RASTER, VECTOR or
+both) and PenRates (pulses per inch):
+    cut time    = cut length / pen speed
+    travel time = head moves / MAX_SPEED
+    raster time = scan lines (one per printer pixel) * band width / pen speed
+Acceleration and the driver's own optimizations are not taken into account:
+this is a first order estimate, good to plan the use of the laser.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import OrderedDict
+from math import hypot
+# numpy is optional, it only makes things faster
+try:
+    import numpy
+except ImportError:
+    numpy = None
+# local library
+from vls460_path import CompactPath, CURVE, LINE
+
+MAX_SPEED = 40.0 # inches per second of the head at 100 %, also for the moves
+DEFAULT_DPI = 1000 # resolution of a dry run without printer settings
+RASTER = 1 # PenMode values, any other one is raster and vector
+VECTOR = 2
+# COLORREF of the pens, as in vls460_calibrate
+PEN_COLORS = [0x000000, 0x0000ff, 0x00ff00, 0x00ffff, 0xff0000, 0xff00ff, 0xffff00, 0x0066ff]
+PEN_NAMES = ['black', 'red', 'green', 'yellow', 'blue', 'pink', 'cyan', 'orange']
+DEFAULT_PENS = {'PenSpeedsCips': [1000]*8, 'PenRates': [500]*8, 'PenPowers': [0]*8, 'PenMode': [0]*8}
+
+def read_las(text):
+    # the Pen* lists of numbers of .las settings
+    pens = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.startswith('Pen'):
+            try:
+                pens[key.strip()] = [int(v) for v in value.split()]
+            except ValueError:
+                pass
+    for key, value in DEFAULT_PENS.items():
+        if len(pens.get(key, [])) < len(PEN_COLORS):
+            pens[key] = value
+    return pens
+
+def pen_of(color):
+    # the pen of the nearest color
+    if color in PEN_COLORS:
+        return PEN_COLORS.index(color)
+    def distance(pen):
+        return sum(((color >> s & 255) - (pen >> s & 255))**2 for s in (0, 8, 16))
+    return min(range(len(PEN_COLORS)), key=lambda i: distance(PEN_COLORS[i]))
+
+def measure(p):
+    # cut length of p, and the (start x, start y, end x, end y) of its subpaths
+    c = p.coords
+    if numpy is not None and CURVE not in p.kinds and len(c):
+        v = numpy.frombuffer(c, dtype=numpy.float64).reshape(-1, 2)
+        d = numpy.hypot(*numpy.diff(v, axis=0).T)
+        starts = numpy.cumsum([0] + [count + 1 for count in p.counts])
+        # the jumps from a subpath to the next one are not cut
+        length = float(d.sum() - d[starts[1:-1] - 1].sum())
+        return length, [(v[s][0], v[s][1], v[e - 1][0], v[e - 1][1]) for s, e in zip(starts[:-1], starts[1:])]
+    length = 0.0
+    ends = []
+    for start, points, first, count in p.subpaths():
+        i = 2*start
+        x0, y0 = sx, sy = c[i], c[i + 1]
+        for kind in p.kinds[first:first + count]:
+            if kind == LINE:
+                x1, y1 = c[i + 2], c[i + 3]
+                length += hypot(x1 - x0, y1 - y0)
+                i += 2
+            else:
+                ax, ay, bx, by, x1, y1 = c[i + 2:i + 8]
+                # mean of the chord and the control polygon
+                length += (hypot(x1 - x0, y1 - y0) + hypot(ax - x0, ay - y0)
+                    + hypot(bx - ax, by - ay) + hypot(x1 - bx, y1 - by)) / 2
+                i += 6
+            x0, y0 = x1, y1
+        ends.append((sx, sy, x0, y0))
+    return length, ends
+
+def raster_bands(boxes):
+    # (height, width) of the bands swept by the head: the boxes overlapping
+    # along the scan lines are merged
+    bands = []
+    top = None
+    for x0, y0, x1, y1 in sorted(boxes, key=lambda b: b[1]):
+        if top is not None and y0 <= bottom:
+            bottom = max(bottom, y1)
+            left, right = min(left, x0), max(right, x1)
+            continue
+        if top is not None:
+            bands.append((bottom - top, right - left))
+        left, top, right, bottom = x0, y0, x1, y1
+    if top is not None:
+        bands.append((bottom - top, right - left))
+    return bands
+
+class JobEstimate():
+    # measures the paths drawn, and hands them over to printer if any
+
+    def __init__(self, scale, las='', printer=None):
+        self.scale = scale # printer pixels per 1/96 inch, as GdiPrinter.scale
+        self.pens = read_las(las)
+        self.printer = printer
+        self.cut = [0.0] * len(PEN_COLORS) # printer pixels
+        self.travel = [0.0] * len(PEN_COLORS)
+        self.position = [(0.0, 0.0)] * len(PEN_COLORS)
+        self.boxes = [[] for pen in PEN_COLORS]
+
+    def create_document(self, docname):
+        if self.printer is not None:
+            self.printer.create_document(docname)
+
+    def close(self):
+        if self.printer is not None:
+            self.printer.close()
+
+    def rectangle_path(self, x, y, width, height):
+        return CompactPath.rectangle(x, y, width, height)
+
+    def draw_path(self, p, color=None, stroke=1, fillcolor=None):
+        if not isinstance(p, CompactPath):
+            p = CompactPath.from_superpath(p)
+        self.add(p, color, fillcolor)
+        if self.printer is not None:
+            self.printer.draw_path(p, color, stroke, fillcolor)
+
+    def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+        paths = [p if isinstance(p, CompactPath) else CompactPath.from_superpath(p) for p in paths]
+        for p in paths:
+            self.add(p, color, fillcolor)
+        if self.printer is not None:
+            self.printer.draw_paths(paths, color, stroke, fillcolor)
+
+    def draw_band(self, x, y, width, height, bits):
+        self.boxes[pen_of(0)].append((x, y, x + width, y + height))
+        if self.printer is not None:
+            self.printer.draw_band(x, y, width, height, bits)
+
+    def add(self, p, color, fillcolor):
+        if color is not None:
+            pen = pen_of(color)
+            if self.pens['PenMode'][pen] == RASTER:
+                self.add_box(pen, p)
+            else:
+                length, ends = measure(p)
+                self.cut[pen] += length
+                x, y = self.position[pen]
+                for sx, sy, ex, ey in ends:
+                    self.travel[pen] += hypot(sx - x, sy - y)
+                    x, y = ex, ey
+                self.position[pen] = (x, y)
+        if fillcolor is not None:
+            pen = pen_of(fillcolor)
+            if self.pens['PenMode'][pen] != VECTOR:
+                self.add_box(pen, p)
+
+    def add_box(self, pen, p):
+        box = p.bounds()
+        if box is not None:
+            self.boxes[pen].append(box)
+
+    def report(self):
+        # per pen and total times in seconds, lengths in millimeters
+        dpi = self.scale * 96
+        mm = 25.4 / dpi
+        pens = []
+        total = OrderedDict([('cut', 0.0), ('travel', 0.0), ('raster', 0.0), ('time', 0.0)])
+        for pen, name in enumerate(PEN_NAMES):
+            speed = MAX_SPEED * self.pens['PenSpeedsCips'][pen] / 1000.0
+            # scan lines (one per printer pixel) * their width
+            sweep = sum(height * width for height, width in raster_bands(self.boxes[pen]))
+            if not (self.cut[pen] or sweep):
+                continue
+            slow = speed <= 0
+            cut_time = self.cut[pen] / dpi / speed if not slow else 0.0
+            travel_time = self.travel[pen] / dpi / MAX_SPEED
+            raster_time = sweep / dpi / speed if not slow else 0.0
+            pens.append(OrderedDict([
+                ('pen', name),
+                ('mode', self.pens['PenMode'][pen]),
+                ('power', self.pens['PenPowers'][pen] / 10.0),
+                ('speed', self.pens['PenSpeedsCips'][pen] / 10.0),
+                ('ppi', self.pens['PenRates'][pen]),
+                ('cut', self.cut[pen] * mm),
+                ('travel', self.travel[pen] * mm),
+                ('raster', sweep * mm * mm),
+                ('pulses', int(self.cut[pen] / dpi * self.pens['PenRates'][pen])),
+                ('time', cut_time + travel_time + raster_time),
+            ]))
+            total['cut'] += pens[-1]['cut']
+            total['travel'] += pens[-1]['travel']
+            total['raster'] += pens[-1]['raster']
+            total['time'] += pens[-1]['time']
+        return OrderedDict([('pens', pens), ('total', total)])
+
+    def summary(self):
+        # the report as a table
+        report = self.report()
+        lines = [
+            ' Pen    |  Speed |   Cut mm | Moves mm | Raster mm2 |    Time',
+            '----------------------------------------------------------------',
+        ]
+        for pen in report['pens'] + [dict(report['total'], pen='total')]:
+            speed = '{:5.1f}%'.format(pen['speed']) if 'speed' in pen else ''
+            lines.append('{pen:6} | {speed:>6} | {cut:8.0f} | {travel:8.0f} | {raster:10.0f} | {clock:>7}'.format(
+                speed=speed, clock=clock(pen['time']), **dict((k, v) for k, v in pen.items() if k != 'speed')))
+        return '\n'.join(lines)
+
+def clock(seconds):
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -34,17 +34,46 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 '''
 # standard library
 from ctypes import *
+import struct
 import sys
-
-if not sys.platform.startswith('win'):
-    exit("sorry, this will run only on Windows, exiting...")
+# local library
+from vls460_path import CompactPath, EllipsePath, LINE, CURVE, join_points, point_buffer
+from vls460_util import LruCache
 
 LASER_PRINTER="VLS4.60"
-GDI32 = WinDLL("gdi32.dll")
-SPOOL = WinDLL("winspool.drv")
 LOGBRUSH = c_long*3
 DM_IN_PROMPT = 4 # call printer property sheet
+DM_IN_BUFFER = 8 # start from the given DEVMODE structure
 DM_OUT_BUFFER = 2 # write to DEVMODE structure
+DEVMODE_SIZE = 156 # sizeof(DEVMODEA) without driver extra bytes
+DEVMODE_FIELDS = 40 # offset of dmFields in DEVMODEA
+DEVMODE_ORIENTATION = 44 # offset of dmOrientation, set when dmFields has DM_ORIENTATION
+DEVMODE_PRINTQUALITY = 58 # offset of dmPrintQuality in DEVMODEA
+DM_ORIENTATION = 0x1
+DMORIENT_LANDSCAPE = 2
+WHITE_BRUSH = 0 # stock objects, selected in a new DC
+BLACK_PEN = 7
+MAX_PENS = 64 # GDI handles kept by GdiPrinter
+MAX_BRUSHES = 64
+DIB_RGB_COLORS = 0
+SRCAND = 0x008800C6 # raster operation: white pixels leave the page as it is
+
+class BITMAPINFO(Structure):
+    # BITMAPINFOHEADER and a black and white palette
+    _fields_ = [
+        ("biSize", c_uint32),
+        ("biWidth", c_int32),
+        ("biHeight", c_int32),
+        ("biPlanes", c_uint16),
+        ("biBitCount", c_uint16),
+        ("biCompression", c_uint32),
+        ("biSizeImage", c_uint32),
+        ("biXPelsPerMeter", c_int32),
+        ("biYPelsPerMeter", c_int32),
+        ("biClrUsed", c_uint32),
+        ("biClrImportant", c_uint32),
+        ("bmiColors", c_uint32*2),
+    ]
 
 # From inkex.errormsg
 def errormsg(msg):
@@ -53,9 +82,99 @@ def errormsg(msg):
     else:
         sys.stderr.write((unicode(msg, "utf-8", errors='replace') + "\n").encode("utf-8"))
 
-class GdiPrinter():
+class Win32Backend():
+    # the real thing: GDI32 and the print spooler through ctypes
 
     def __init__(self):
+        if not sys.platform.startswith('win'):
+            exit("sorry, this will run only on Windows, exiting...")
+        self.gdi = WinDLL("gdi32.dll")
+        self.spool = WinDLL("winspool.drv")
+
+class RecordingBackend():
+    # headless stand-in for GDI32 and the print spooler, nothing is printed:
+    # every call is counted in self.counts and, unless log is False, appended
+    # to self.calls as (name, args) with ctypes arrays copied to lists
+
+    def __init__(self, dpi=1000, log=True, printer=LASER_PRINTER):
+        self.gdi = self
+        self.spool = self
+        self.dpi = dpi
+        self.log = log
+        self.printer = printer
+        self.calls = []
+        self.counts = {}
+        self.last_handle = 0
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        # any other GDI function just succeeds
+        def call(*args):
+            return self.record(name, args, 1)
+        setattr(self, name, call)
+        return call
+
+    def record(self, name, args, result):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self.log:
+            self.calls.append((name, tuple(self.snapshot(arg) for arg in args)))
+        return result
+
+    def snapshot(self, arg):
+        # copy ctypes buffers, they are reused or freed after the call
+        if isinstance(arg, Array):
+            return arg.value if arg._type_ is c_char else list(arg)
+        return arg
+
+    def new_handle(self):
+        self.last_handle += 1
+        return self.last_handle
+
+    def GetDefaultPrinterA(self, pname, pcchBuffer):
+        if pname is None:
+            pcchBuffer._obj.value = len(self.printer) + 1
+        else:
+            pname.value = self.printer
+        return self.record('GetDefaultPrinterA', (pname, pcchBuffer), 1)
+
+    def OpenPrinterA(self, pname, phPrinter, pDefault):
+        phPrinter._obj.value = self.new_handle()
+        return self.record('OpenPrinterA', (pname, phPrinter, pDefault), 1)
+
+    def DocumentPropertiesA(self, hWnd, hPrinter, pname, pDevModeOutput, pDevModeInput, fMode):
+        if fMode == 0:
+            result = DEVMODE_SIZE
+        elif fMode & DM_IN_BUFFER:
+            result = 1 # the settings are kept
+        else:
+            # fill in dmPrintQuality as the VLS driver does, answer IDOK
+            pDevMode = pDevModeOutput._obj
+            memmove(addressof(pDevMode) + DEVMODE_PRINTQUALITY, struct.pack('<H', self.dpi), 2)
+            result = 1
+        return self.record('DocumentPropertiesA',
+            (hWnd, hPrinter, pname, pDevModeOutput, pDevModeInput, fMode), result)
+
+    def CreateDCA(self, *args):
+        return self.record('CreateDCA', args, self.new_handle())
+
+    def CreatePen(self, *args):
+        return self.record('CreatePen', args, self.new_handle())
+
+    def CreateBrushIndirect(self, *args):
+        return self.record('CreateBrushIndirect', args, self.new_handle())
+
+class GdiPrinter():
+
+    def __init__(self, backend=None, devmode=None, prompt=False):
+        # devmode: the raw DEVMODE of a previous run, to print without the
+        # printer properties dialog unless prompt is True
+        if backend is None:
+            backend = Win32Backend()
+        self.backend = backend
+        self.gdi = backend.gdi
+        self.spool = backend.spool
+
         pname, hPrinter = self.open_printer(LASER_PRINTER)
         if pname is None:
             pname, hPrinter = self.open_printer()
@@ -63,32 +182,55 @@ class GdiPrinter():
         if pname is None:
             exit('Failed to open the "{}" or default printer'.format(LASER_PRINTER))
 
-        # get printer properties dialog
         #FIXME: hWnd = windll.user32.GetForegroundWindow()
         hWnd = 0
         pcchBuffer = c_long()
-        pcchBuffer = SPOOL.DocumentPropertiesA(hWnd, hPrinter, pname, None, None, 0)
-        #FIXME: pDevMode = create_string_buffer(pcchBuffer + 100) # allocate extra just in case
-        pDevMode = create_string_buffer(pcchBuffer)
-        pcchBuffer = SPOOL.DocumentPropertiesA(hWnd, hPrinter, pname, byref(pDevMode), None, DM_IN_PROMPT + DM_OUT_BUFFER)
-        if pcchBuffer != 1: # user clicked Cancel
-            exit()
+        pcchBuffer = self.spool.DocumentPropertiesA(hWnd, hPrinter, pname, None, None, 0)
+        if devmode is not None and len(devmode) != pcchBuffer:
+            # saved with another driver or driver version
+            errormsg('Saved printer settings do not match the "{}" driver, ignored'.format(pname.value))
+            devmode = None
+        if devmode is None:
+            # get printer properties dialog
+            #FIXME: pDevMode = create_string_buffer(pcchBuffer + 100) # allocate extra just in case
+            pDevMode = create_string_buffer(pcchBuffer)
+            pcchBuffer = self.spool.DocumentPropertiesA(hWnd, hPrinter, pname, byref(pDevMode), None, DM_IN_PROMPT + DM_OUT_BUFFER)
+            if pcchBuffer != 1: # user clicked Cancel
+                exit()
+        elif prompt:
+            # the dialog starts from the saved settings
+            pDevMode = create_string_buffer(devmode, len(devmode))
+            pcchBuffer = self.spool.DocumentPropertiesA(hWnd, hPrinter, pname, byref(pDevMode), byref(pDevMode),
+                DM_IN_PROMPT + DM_IN_BUFFER + DM_OUT_BUFFER)
+            if pcchBuffer != 1: # user clicked Cancel
+                exit()
+        else:
+            pDevMode = create_string_buffer(devmode, len(devmode))
 
         self.pname = pname
         self.hPrinter = hPrinter
         self.pDevMode = pDevMode
+        self.devmode = pDevMode.raw
+
+        # pens and brushes are created once per (color, stroke) or fill color
+        self.pens = LruCache(MAX_PENS, self.delete_pen)
+        self.brushes = LruCache(MAX_BRUSHES, self.delete_brush)
+        self.hPen = None # currently selected in the DC
+        self.hBrush = None
+        self.stats = None # a vls460_stats.Stats to time the spooling
+        self.emit = None # a vls460_stats.Timer of the drawing calls
 
     def open_printer(self, name=None):
         if name is None:
             pcchBuffer = c_ulong()
-            SPOOL.GetDefaultPrinterA(None, byref(pcchBuffer))     # get length of printer name
+            self.spool.GetDefaultPrinterA(None, byref(pcchBuffer))     # get length of printer name
             pname = create_string_buffer(pcchBuffer.value)
-            SPOOL.GetDefaultPrinterA(pname, byref(pcchBuffer))    # get printer name
+            self.spool.GetDefaultPrinterA(pname, byref(pcchBuffer))    # get printer name
         else:
             pname = create_string_buffer(LASER_PRINTER)
 
         hPrinter = c_long()
-        if SPOOL.OpenPrinterA(pname.value, byref(hPrinter), None) == 0:
+        if self.spool.OpenPrinterA(pname.value, byref(hPrinter), None) == 0:
             return None, None
 
         return pname, hPrinter
@@ -98,7 +240,7 @@ class GdiPrinter():
         hPrinter = self.hPrinter
         pDevMode = self.pDevMode
 
-        self.hDC = GDI32.CreateDCA(None, pname, None, byref(pDevMode))
+        self.hDC = self.gdi.CreateDCA(None, pname, None, byref(pDevMode))
 
         class DOCINFO(Structure):
             _fields_ = [
@@ -109,49 +251,188 @@ class GdiPrinter():
                 ("fwType", c_ulong),
             ]
         docInfo = DOCINFO(sizeof(DOCINFO), docname, None, "raw", 0)
-        if GDI32.StartDocA(self.hDC, byref(docInfo)) < 0:
+        if self.gdi.StartDocA(self.hDC, byref(docInfo)) < 0:
             exit() # user clicked Cancel
         self.scale = (ord(pDevMode[58]) + 256.0*ord(pDevMode[59]))/96 # use PrintQuality from DEVMODE
 
     def close(self):
-        GDI32.EndDoc(self.hDC)
-        SPOOL.ClosePrinter(self.hPrinter)
+        self.end_document()
+        self.close_printer()
+
+    def end_document(self):
+        # the printer stays open for the next document
+        if self.stats is not None:
+            start = self.stats.start()
+        # release the pooled pens and brushes before the DC
+        self.pens.clear()
+        self.brushes.clear()
+        self.gdi.EndDoc(self.hDC)
+        self.gdi.DeleteDC(self.hDC)
+        if self.stats is not None:
+            self.stats.stop('spool', start)
+
+    def abort_document(self):
+        # drop a document left half drawn, e.g. by a failed replay
+        self.pens.clear()
+        self.brushes.clear()
+        self.gdi.AbortDoc(self.hDC)
+        self.gdi.DeleteDC(self.hDC)
+
+    def set_devmode(self, devmode):
+        # settings of the next documents, False if they do not fit the driver
+        if len(devmode) != len(self.devmode):
+            return False
+        self.pDevMode = create_string_buffer(devmode, len(devmode))
+        self.devmode = devmode
+        return True
+
+    def close_printer(self):
+        # enough when no document was created
+        self.spool.ClosePrinter(self.hPrinter)
+
+    def select_pen(self, color, stroke=1):
+        hPen = self.pens.get((color, stroke))
+        if hPen is None:
+            hPen = self.gdi.CreatePen(0, stroke, color)
+            self.pens.put((color, stroke), hPen)
+        if hPen != self.hPen:
+            self.gdi.SelectObject(self.hDC, hPen)
+            self.hPen = hPen
+
+    def select_brush(self, fillcolor):
+        hBrush = self.brushes.get(fillcolor)
+        if hBrush is None:
+            brush = LOGBRUSH(0, fillcolor, 0)
+            hBrush = self.gdi.CreateBrushIndirect(brush)
+            self.brushes.put(fillcolor, hBrush)
+        if hBrush != self.hBrush:
+            self.gdi.SelectObject(self.hDC, hBrush)
+            self.hBrush = hBrush
+
+    def delete_pen(self, key, hPen):
+        # a selected object cannot be deleted, put the stock one back first
+        if hPen == self.hPen:
+            self.gdi.SelectObject(self.hDC, self.gdi.GetStockObject(BLACK_PEN))
+            self.hPen = None
+        self.gdi.DeleteObject(hPen)
+
+    def delete_brush(self, key, hBrush):
+        if hBrush == self.hBrush:
+            self.gdi.SelectObject(self.hDC, self.gdi.GetStockObject(WHITE_BRUSH))
+            self.hBrush = None
+        self.gdi.DeleteObject(hBrush)
 
     def rectangle_path(self, x, y, width, height):
-        p = [[[x, y],[x, y],[x, y]]]
-        p.append([[x + width, y],[x + width, y],[x + width, y]])
-        p.append([[x + width, y + height],[x + width, y + height],[x + width, y + height]])
-        p.append([[x, y + height],[x, y + height],[x, y + height]])
-        p.append([[x, y],[x, y],[x, y]])
-        return [p]
+        return CompactPath.rectangle(x, y, width, height)
 
     def draw_path(self, p, color=None, stroke=1, fillcolor=None):
+        if self.emit is not None:
+            start = self.emit.start()
+        if not isinstance(p, CompactPath):
+            p = CompactPath.from_superpath(p)
         if color is not None:
-            hPen = GDI32.CreatePen(0, stroke, color)
-            GDI32.SelectObject(self.hDC, hPen)
+            self.select_pen(color, stroke)
             self.emit_path(p)
         if fillcolor is not None:
-            brush = LOGBRUSH(0, fillcolor, 0)
-            hBrush = GDI32.CreateBrushIndirect(addressof(brush))
-            GDI32.SelectObject(self.hDC, hBrush)
-            GDI32.BeginPath(self.hDC)
-            self.emit_path(p)
-            GDI32.EndPath(self.hDC)
-            GDI32.FillPath(self.hDC)
-
-    def emit_path(self, p):
-        for sub in p:
-            GDI32.MoveToEx(self.hDC, int(sub[0][1][0]), int(sub[0][1][1]), None)
-            POINTS = c_long*(6*(len(sub)-1))
-            points = POINTS()
-            for i in range(len(sub)-1):
-                points[6*i]     = int(sub[i][2][0])
-                points[6*i + 1] = int(sub[i][2][1])
-                points[6*i + 2] = int(sub[i + 1][0][0])
-                points[6*i + 3] = int(sub[i + 1][0][1])
-                points[6*i + 4] = int(sub[i + 1][1][0])
-                points[6*i + 5] = int(sub[i + 1][1][1])
-            GDI32.PolyBezierTo(self.hDC, addressof(points), 3*(len(sub)-1))
-        return
+            self.select_brush(fillcolor)
+            self.gdi.BeginPath(self.hDC)
+            self.emit_path(p, True)
+            self.gdi.EndPath(self.hDC)
+            self.gdi.FillPath(self.hDC)
+        if self.emit is not None:
+            self.emit.stop(start)
+
+    def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+        # same as draw_path() for a whole group of paths sharing their colors:
+        # one pen selection, one brush selection; the fills keep a path
+        # bracket each, in a single one the overlaps of ALTERNATE would cancel out
+        if self.emit is not None:
+            start = self.emit.start()
+        if color is not None:
+            self.select_pen(color, stroke)
+            self.emit_paths(paths)
+        if fillcolor is not None:
+            self.select_brush(fillcolor)
+            for p in paths:
+                self.gdi.BeginPath(self.hDC)
+                self.emit_paths([p], True)
+                self.gdi.EndPath(self.hDC)
+                self.gdi.FillPath(self.hDC)
+        if self.emit is not None:
+            self.emit.stop(start)
+
+    def draw_band(self, x, y, width, height, bits):
+        # a band of image: bottom-up 1 bpp DIB rows, 0 black, at its size
+        if self.emit is not None:
+            start = self.emit.start()
+        info = BITMAPINFO(sizeof(BITMAPINFO) - 8, width, height, 1, 1, 0, len(bits), 0, 0, 2, 2)
+        info.bmiColors[1] = 0xffffff
+        self.gdi.StretchDIBits(self.hDC, x, y, width, height, 0, 0, width, height,
+            bits, byref(info), DIB_RGB_COLORS, SRCAND)
+        if self.emit is not None:
+            self.emit.stop(start)
+
+    def emit_paths(self, paths, fill=False):
+        # consecutive straight subpaths go out in a single PolyPolyline call,
+        # curved ones in a single PolyBezier call each, mixed ones in runs
+        lines = []
+        for p in paths:
+            if not isinstance(p, CompactPath):
+                p = CompactPath.from_superpath(p)
+            if isinstance(p, EllipsePath) and p.box is not None:
+                self.poly_polyline(lines)
+                lines = []
+                self.emit_ellipse(p.box, fill)
+                continue
+            points = p.rounded()
+            for start, count, first, segments in p.subpaths():
+                kinds = p.kinds[first:first + segments]
+                if CURVE not in kinds:
+                    lines.append((points, start, count))
+                    continue
+                self.poly_polyline(lines)
+                lines = []
+                if LINE in kinds:
+                    self.emit_subpath(p, points, start, first, segments)
+                else:
+                    self.gdi.PolyBezier(self.hDC, point_buffer(points, start, count), count)
+        self.poly_polyline(lines)
+
+    def poly_polyline(self, lines):
+        if lines:
+            points, start = join_points(lines)
+            counts = [count for p, s, count in lines]
+            COUNTS = c_ulong*len(counts)
+            self.gdi.PolyPolyline(self.hDC, point_buffer(points, start, sum(counts)),
+                COUNTS(*counts), len(counts))
+
+    def emit_path(self, p, fill=False):
+        if isinstance(p, EllipsePath) and p.box is not None:
+            self.emit_ellipse(p.box, fill)
+            return
+        # the points are rounded once, every GDI call gets a view on that buffer
+        points = p.rounded()
+        for start, count, first, segments in p.subpaths():
+            self.emit_subpath(p, points, start, first, segments)
+
+    def emit_ellipse(self, box, fill):
+        # in the path bracket of a fill, Ellipse adds a closed figure; the
+        # outline is an Arc from the right end back to it, Ellipse would also
+        # fill it with the selected brush
+        left, top, right, bottom = [int(round(v)) for v in box]
+        if fill:
+            self.gdi.Ellipse(self.hDC, left, top, right, bottom)
+        else:
+            y = (top + bottom) // 2
+            self.gdi.Arc(self.hDC, left, top, right, bottom, right, y, right, y)
+
+    def emit_subpath(self, p, points, start, first, segments):
+        # straight runs go through PolylineTo, curved ones through PolyBezierTo
+        self.gdi.MoveToEx(self.hDC, int(points[2*start]), int(points[2*start + 1]), None)
+        for kind, i, n in p.segments(start, first, segments):
+            if kind == LINE:
+                self.gdi.PolylineTo(self.hDC, point_buffer(points, i, n), n)
+            else:
+                self.gdi.PolyBezierTo(self.hDC, point_buffer(points, i, 3*n), 3*n)
 
 # vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_job.py
+Compiled print jobs: the output of vls460_print saved to a file, to be sent to
+the laser later without Inkscape, e.g.:
+    inkex.cmd vls460_job drawing.vlsjob
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+A job file is:
+    JOB_MAGIC
+    JOB_HEADER: JOB_VERSION, lengths of the DEVMODE, .las settings and
+                document name
+    the raw DEVMODE, the .las settings and the document name
+then one record per draw_path() or draw_paths() call of the printer:
+    RECORD_KIND: DRAW_PATH or DRAW_PATHS
+    PATH_HEADER: the colors (-1 for none), numbers of int32 coordinates,
+                 segment kinds and subpaths
+    the rounded x, y (int32), kinds (int8) and segment counts (int32)
+or per ellipse GDI draws as such, see vls460_path.EllipsePath:
+    RECORD_KIND: DRAW_ELLIPSE
+    ELLIPSE_BOX: its rounded left, top, right, bottom
+    then as a DRAW_PATH record, from PATH_HEADER on
+or per draw_band() call:
+    RECORD_KIND: DRAW_BAND
+    BAND_HEADER: x, y, width, height, number of bytes
+    the bits of the band
+all in the native byte order. A reader refuses the versions it does not
+know. The paths of a color group are packed in a single record, the runs
+between its ellipses when there are some, so a replay makes the same GDI
+calls as the first run.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from array import array
+from optparse import OptionParser
+from os.path import expanduser
+import struct
+# local library
+from vls460_gdi import (DEVMODE_FIELDS, DEVMODE_ORIENTATION, DEVMODE_PRINTQUALITY, DM_ORIENTATION,
+    DMORIENT_LANDSCAPE, GdiPrinter, RecordingBackend, errormsg)
+from vls460_path import CompactPath, EllipsePath
+
+JOB_MAGIC = b'VLS460JF'
+JOB_VERSION = 2
+JOB_HEADER = struct.Struct('<HIII')
+RECORD_KIND = struct.Struct('<B')
+PATH_HEADER = struct.Struct('<iiiIII')
+BAND_HEADER = struct.Struct('<iiIII')
+ELLIPSE_BOX = struct.Struct('<iiii')
+DRAW_PATH = 1 # record kinds
+DRAW_PATHS = 2
+DRAW_BAND = 3
+DRAW_ELLIPSE = 4
+
+def is_ellipse(p):
+    return isinstance(p, EllipsePath) and p.box is not None
+
+def devmode_dpi(devmode):
+    return struct.unpack_from('<H', devmode, DEVMODE_PRINTQUALITY)[0]
+
+def devmode_orientation(devmode):
+    # True for landscape, False for portrait, None when the driver does not say
+    if not struct.unpack_from('<I', devmode, DEVMODE_FIELDS)[0] & DM_ORIENTATION:
+        return None
+    return struct.unpack_from('<h', devmode, DEVMODE_ORIENTATION)[0] == DMORIENT_LANDSCAPE
+
+class RoundedPath(CompactPath):
+    # a CompactPath read back from a job, its points already rounded
+    __slots__ = ('ints',)
+
+    def __init__(self, ints, kinds, counts):
+        CompactPath.__init__(self, None, kinds, counts)
+        self.ints = ints
+
+    def __getstate__(self):
+        return self.ints, self.kinds, self.counts
+
+    def points(self):
+        return len(self.ints) // 2
+
+    def rounded(self):
+        return self.ints
+
+class JobWriter():
+    # stands for GdiPrinter in vls460_print, the drawing goes to a job file
+
+    def __init__(self, filename, devmode, las=b''):
+        self.filename = filename
+        self.devmode = devmode
+        self.las = las
+        self.scale = devmode_dpi(devmode) / 96.0
+        self.fh = None
+
+    def create_document(self, docname):
+        las = self.las
+        if not isinstance(docname, bytes):
+            docname = docname.encode('utf-8')
+        self.fh = open(self.filename, 'wb')
+        self.fh.write(JOB_MAGIC)
+        self.fh.write(JOB_HEADER.pack(JOB_VERSION, len(self.devmode), len(las), len(docname)))
+        self.fh.write(self.devmode)
+        self.fh.write(las)
+        self.fh.write(docname)
+
+    def close(self):
+        self.fh.close()
+
+    def rectangle_path(self, x, y, width, height):
+        return CompactPath.rectangle(x, y, width, height)
+
+    def draw_path(self, p, color=None, stroke=1, fillcolor=None):
+        if not isinstance(p, CompactPath):
+            p = CompactPath.from_superpath(p)
+        self.write(DRAW_ELLIPSE if is_ellipse(p) else DRAW_PATH, [p], color, stroke, fillcolor)
+
+    def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+        paths = [p if isinstance(p, CompactPath) else CompactPath.from_superpath(p) for p in paths]
+        if fillcolor is None:
+            run = []
+            for p in paths:
+                if is_ellipse(p):
+                    if run:
+                        self.write(DRAW_PATHS, run, color, stroke, fillcolor)
+                        run = []
+                    self.write(DRAW_ELLIPSE, [p], color, stroke, fillcolor)
+                else:
+                    run.append(p)
+            if run or not paths:
+                self.write(DRAW_PATHS, run, color, stroke, fillcolor)
+        else:
+            # a record is replayed as one path, the fills are filled one by one
+            for p in paths:
+                self.write(DRAW_ELLIPSE if is_ellipse(p) else DRAW_PATHS, [p], color, stroke, fillcolor)
+
+    def draw_band(self, x, y, width, height, bits):
+        self.fh.write(RECORD_KIND.pack(DRAW_BAND))
+        self.fh.write(BAND_HEADER.pack(x, y, width, height, len(bits)))
+        self.fh.write(bits)
+
+    def write(self, kind, paths, color, stroke, fillcolor):
+        self.fh.write(RECORD_KIND.pack(kind))
+        if kind == DRAW_ELLIPSE:
+            self.fh.write(ELLIPSE_BOX.pack(*[int(round(v)) for v in paths[0].box]))
+        self.fh.write(PATH_HEADER.pack(
+            -1 if color is None else color, stroke, -1 if fillcolor is None else fillcolor,
+            sum(2*p.points() for p in paths), sum(len(p.kinds) for p in paths),
+            sum(len(p.counts) for p in paths)))
+        for p in paths:
+            self.fh.write(p.rounded().tostring())
+        for p in paths:
+            self.fh.write(p.kinds.tostring())
+        for p in paths:
+            self.fh.write(array('i', p.counts).tostring())
+
+class JobReader():
+    # the records are read one at a time, whatever the size of the job
+
+    def __init__(self, filename):
+        self.fh = open(filename, 'rb')
+        try:
+            self.read_header(filename)
+        except ValueError:
+            self.fh.close()
+            raise
+        self.dpi = devmode_dpi(self.devmode)
+
+    def read_header(self, filename):
+        if self.fh.read(len(JOB_MAGIC)) != JOB_MAGIC:
+            raise ValueError('{} is not a VLS460 job file'.format(filename))
+        version, ndevmode, nlas, ndocname = JOB_HEADER.unpack(self.read(JOB_HEADER.size))
+        if version != JOB_VERSION:
+            raise ValueError('{} is a job of format {}, only {} is supported'.format(filename, version, JOB_VERSION))
+        self.devmode = self.read(ndevmode)
+        self.las = self.read(nlas)
+        self.docname = self.read(ndocname)
+
+    def __iter__(self):
+        # (kind, path, color, stroke, fillcolor) of each record
+        while True:
+            kind = self.fh.read(RECORD_KIND.size)
+            if not kind:
+                break
+            kind, = RECORD_KIND.unpack(kind)
+            if kind == DRAW_BAND:
+                # x, y, width, height and the bits
+                x, y, width, height, nbytes = BAND_HEADER.unpack(self.read(BAND_HEADER.size))
+                yield kind, (x, y, width, height, self.read(nbytes)), None, 1, None
+                continue
+            if kind not in (DRAW_PATH, DRAW_PATHS, DRAW_ELLIPSE):
+                raise ValueError('unknown job record {}'.format(kind))
+            box = None
+            if kind == DRAW_ELLIPSE:
+                box = ELLIPSE_BOX.unpack(self.read(ELLIPSE_BOX.size))
+            color, stroke, fillcolor, nints, nkinds, ncounts = PATH_HEADER.unpack(self.read(PATH_HEADER.size))
+            ints = array('i')
+            ints.fromstring(self.read(4*nints))
+            kinds = array('b')
+            kinds.fromstring(self.read(nkinds))
+            counts = array('i')
+            counts.fromstring(self.read(4*ncounts))
+            if box is not None:
+                p = EllipsePath(array('d', ints), kinds, array('l', counts), box)
+            else:
+                p = RoundedPath(ints, kinds, array('l', counts))
+            yield kind, p, None if color < 0 else color, stroke, None if fillcolor < 0 else fillcolor
+
+    def read(self, size):
+        data = self.fh.read(size)
+        if len(data) < size:
+            raise ValueError('truncated job file')
+        return data
+
+    def close(self):
+        self.fh.close()
+
+def replay(job, printer):
+    for kind, p, color, stroke, fillcolor in job:
+        if kind == DRAW_BAND:
+            printer.draw_band(*p)
+        elif kind == DRAW_PATHS:
+            printer.draw_paths([p], color, stroke, fillcolor)
+        else:
+            printer.draw_path(p, color, stroke, fillcolor)
+
+def main():
+    optionParser = OptionParser(usage='usage: %prog [options] JOB')
+    optionParser.add_option(
+        '--backend', action='store', type='choice',
+        dest='backend', choices=['gdi', 'record'], default='gdi',
+        help='Send to the printer (gdi) or only record the GDI calls (record)')
+    optionParser.add_option(
+        '--las', action='store', type='string',
+        dest='las', default='',
+        help='Write the laser settings of the job to this .las file before printing')
+    options, args = optionParser.parse_args()
+    if len(args) != 1:
+        optionParser.error('one job file expected')
+
+    job = JobReader(args[0])
+    if options.las and job.las:
+        with open(expanduser(options.las), 'wb') as fh:
+            fh.write(job.las)
+
+    if options.backend == 'record':
+        backend = RecordingBackend(dpi=job.dpi, log=False)
+    else:
+        backend = None
+    printer = GdiPrinter(backend, devmode=job.devmode)
+    printer.create_document(job.docname)
+    replay(job, printer)
+    printer.close()
+    job.close()
+    if options.backend == 'record':
+        errormsg('GDI calls: ' + ', '.join('{} {}'.format(name, count)
+            for name, count in sorted(backend.counts.items())))
+
+if __name__ == '__main__':
+    main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_order.py
+Reorder the subpaths of a pen color to shorten the laser head moves between cuts.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+The subpaths are read in place from the arrays of the CompactPaths, see
+vls460_path.Subpath, and only copied once ordered; the ellipses GDI draws as
+such are kept whole, starting at their right end. The ordering is a nearest
+neighbour tour over a grid index of the subpath ends, improved by a windowed
+2-opt; open subpaths may be reversed and closed ones may start at any of their
+nodes. When cutting parts out, the subpaths lying inside closed contours
+(holes) are cut before these contours, see order_inside_first().
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from math import ceil, hypot, sqrt
+# local library
+from vls460_path import CURVE, CompactPath, EllipsePath, Subpath
+
+TWO_OPT_WINDOW = 24 # subpaths looked ahead by the 2-opt pass
+TWO_OPT_PASSES = 4
+EPSILON = 1e-6
+RTREE_NODE_SIZE = 16
+FLATTEN_STEPS = 8 # chords per curved segment when testing containment
+
+def distance(a, b):
+    return hypot(a[0] - b[0], a[1] - b[1])
+
+def is_closed(sub):
+    return distance(sub.begin(), sub.end()) < EPSILON
+
+def is_ellipse(sub):
+    # drawn by GDI from its box, as long as it is not reordered itself
+    return isinstance(sub.path, EllipsePath) and sub.path.box is not None
+
+def flatten(paths):
+    # all the drawable subpaths of a list of CompactPaths
+    return [Subpath(p, *s) for p in paths for s in p.subpaths() if s[3] > 0]
+
+def travel_length(subs, origin=(0.0, 0.0)):
+    # head moves from origin through subs, in order
+    length = 0.0
+    position = origin
+    for sub in subs:
+        length += distance(position, sub.begin())
+        position = sub.end()
+    return length
+
+class PathList():
+    # the ordered subpaths copied to CompactPaths, the ellipses as they are
+
+    def __init__(self):
+        self.paths = []
+        self.path = CompactPath()
+
+    def add(self, sub, flip=False, segment=0):
+        # returns the end point of sub
+        if is_ellipse(sub):
+            self.end()
+            self.paths.append(sub.path)
+            return sub.end()
+        return sub.append_to(self.path, flip, segment)
+
+    def end(self):
+        if len(self.path):
+            self.paths.append(self.path)
+            self.path = CompactPath()
+        return self.paths
+
+class GridIndex():
+    # points bucketed in square cells; removed items are skipped lazily
+
+    def __init__(self, entries, count):
+        # entries: list of (x, y, item), count: expected number of items
+        xs = [e[0] for e in entries] or [0.0]
+        ys = [e[1] for e in entries] or [0.0]
+        width, height = max(xs) - min(xs), max(ys) - min(ys)
+        count = max(count, 1)
+        # about one item per cell, even when all of them are on a line
+        self.cell = max(sqrt(width * height / count), max(width, height) / count, 1.0)
+        self.cells = {}
+        for entry in entries:
+            key = (int(entry[0] // self.cell), int(entry[1] // self.cell))
+            self.cells.setdefault(key, []).append(entry)
+        keys = self.cells.keys() or [(0, 0)]
+        self.bounds = (
+            min(k[0] for k in keys), min(k[1] for k in keys),
+            max(k[0] for k in keys), max(k[1] for k in keys))
+
+    def ring(self, cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for i in range(-r, r + 1):
+            yield (cx + i, cy - r)
+            yield (cx + i, cy + r)
+        for j in range(-r + 1, r):
+            yield (cx - r, cy + j)
+            yield (cx + r, cy + j)
+
+    def nearest(self, x, y, removed):
+        # nearest entry whose item is not removed(item), or None
+        cell = self.cell
+        cx, cy = int(x // cell), int(y // cell)
+        x0, y0, x1, y1 = self.bounds
+        rmax = max(cx - x0, x1 - cx, cy - y0, y1 - cy, 0)
+        best = None
+        bestd = None
+        r = 0
+        while r <= rmax:
+            for key in self.ring(cx, cy, r):
+                entries = self.cells.get(key)
+                if not entries:
+                    continue
+                alive = [e for e in entries if not removed(e[2])]
+                if len(alive) < len(entries):
+                    if alive:
+                        self.cells[key] = alive
+                    else:
+                        del self.cells[key]
+                for e in alive:
+                    d = (e[0] - x)**2 + (e[1] - y)**2
+                    if bestd is None or d < bestd:
+                        best, bestd = e, d
+            # whatever lies beyond ring r is at least r cells away
+            if best is not None and bestd <= (r * cell)**2:
+                break
+            r += 1
+        return best
+
+def nearest_neighbour(subs, origin):
+    # greedy tour: list of (index, reversed) pairs
+    entries = []
+    for k, sub in enumerate(subs):
+        start, end = sub.begin(), sub.end()
+        entries.append((start[0], start[1], (k, False)))
+        if not is_closed(sub) and not is_ellipse(sub):
+            entries.append((end[0], end[1], (k, True)))
+    index = GridIndex(entries, len(subs))
+    used = [False] * len(subs)
+    removed = lambda item: used[item[0]]
+    tour = []
+    position = origin
+    for i in range(len(subs)):
+        entry = index.nearest(position[0], position[1], removed)
+        k, flip = entry[2]
+        used[k] = True
+        tour.append((k, flip))
+        position = subs[k].begin() if flip else subs[k].end()
+    return tour
+
+def two_opt(subs, tour, origin, window=TWO_OPT_WINDOW, passes=TWO_OPT_PASSES):
+    # reverse runs of the tour (and the direction of each subpath in them)
+    # as long as it shortens the moves, looking at most window subpaths ahead
+    n = len(tour)
+    index = [k for k, flip in tour]
+    flips = [flip for k, flip in tour]
+    S = [subs[k].end() if flip else subs[k].begin() for k, flip in tour] # entry points
+    E = [subs[k].begin() if flip else subs[k].end() for k, flip in tour] # exit points
+    for p in range(passes):
+        improved = False
+        for i in range(n - 1):
+            # the coordinates are unpacked once: this loop is the bulk of the time
+            px, py = E[i - 1] if i else origin
+            sx, sy = S[i]
+            enter = hypot(px - sx, py - sy)
+            for j in range(i + 1, min(n, i + window)):
+                ex, ey = E[j]
+                before = enter
+                after = hypot(px - ex, py - ey)
+                if j + 1 < n:
+                    nx, ny = S[j + 1]
+                    before += hypot(ex - nx, ey - ny)
+                    after += hypot(sx - nx, sy - ny)
+                if after < before - EPSILON:
+                    index[i:j + 1] = index[i:j + 1][::-1]
+                    flips[i:j + 1] = [not f for f in flips[i:j + 1][::-1]]
+                    S[i:j + 1], E[i:j + 1] = E[i:j + 1][::-1], S[i:j + 1][::-1]
+                    sx, sy = S[i]
+                    enter = hypot(px - sx, py - sy)
+                    improved = True
+        if not improved:
+            break
+    return list(zip(index, flips))
+
+def place(subs, tour, position, paths):
+    # add the subpaths of tour to the PathList paths, from position; returns
+    # the position of the head after them
+    for k, flip in tour:
+        sub = subs[k]
+        segment = 0
+        if is_ellipse(sub):
+            flip = False
+        elif is_closed(sub):
+            # enter a closed subpath at its node nearest to the head
+            nodes = sub.nodes()
+            segment = min(range(len(nodes)), key=lambda i: distance(position, sub.point(nodes[i])))
+            flip = False
+        position = paths.add(sub, flip, segment)
+    return position
+
+def optimize_travel(paths, origin=(0.0, 0.0), window=TWO_OPT_WINDOW):
+    # returns the reordered paths, the head travel before and after
+    subs = flatten(paths)
+    before = travel_length(subs, origin)
+    if len(subs) < 2:
+        return paths, before, before
+    tour = nearest_neighbour(subs, origin)
+    tour = two_opt(subs, tour, origin, window)
+    ordered = PathList()
+    place(subs, tour, origin, ordered)
+    ordered = ordered.end()
+    return ordered, before, travel_length(flatten(ordered), origin)
+
+def polygon(sub):
+    # closed subpath approximated by chords, curved segments split in FLATTEN_STEPS
+    v = sub.path.coords
+    i = 2*sub.start
+    points = [(v[i], v[i + 1])]
+    for kind in sub.kinds():
+        if kind == CURVE:
+            p0, c1, c2 = points[-1], (v[i + 2], v[i + 3]), (v[i + 4], v[i + 5])
+            i += 6
+            p1 = (v[i], v[i + 1])
+            for k in range(1, FLATTEN_STEPS):
+                t = k / float(FLATTEN_STEPS)
+                u = 1 - t
+                a, b, c, d = u*u*u, 3*u*u*t, 3*u*t*t, t*t*t
+                points.append((
+                    a*p0[0] + b*c1[0] + c*c2[0] + d*p1[0],
+                    a*p0[1] + b*c1[1] + c*c2[1] + d*p1[1]))
+        else:
+            i += 2
+        points.append((v[i], v[i + 1]))
+    return points
+
+class BoxTree():
+    # static R-tree over (x0, y0, x1, y1, item) boxes, packed by sort-tile-recursive:
+    # every node holds (x0, y0, x1, y1, children) entries, leaves hold the boxes
+
+    def __init__(self, boxes, size=RTREE_NODE_SIZE):
+        self.size = size
+        self.height = 0
+        level = list(boxes)
+        while len(level) > size:
+            level = self.pack(level)
+            self.height += 1
+        self.root = level
+
+    def pack(self, entries):
+        size = self.size
+        slabs = int(ceil(sqrt(ceil(len(entries) / float(size)))))
+        per_slab = slabs * size
+        entries = sorted(entries, key=lambda e: e[0] + e[2])
+        parents = []
+        for s in range(0, len(entries), per_slab):
+            slab = sorted(entries[s:s + per_slab], key=lambda e: e[1] + e[3])
+            for i in range(0, len(slab), size):
+                group = slab[i:i + size]
+                parents.append((
+                    min(e[0] for e in group), min(e[1] for e in group),
+                    max(e[2] for e in group), max(e[3] for e in group),
+                    group))
+        return parents
+
+    def search(self, x, y):
+        # items whose box holds the point
+        found = []
+        stack = [(self.root, self.height)]
+        while stack:
+            entries, height = stack.pop()
+            for e in entries:
+                if e[0] <= x <= e[2] and e[1] <= y <= e[3]:
+                    if height:
+                        stack.append((e[4], height - 1))
+                    else:
+                        found.append(e[4])
+        return found
+
+class Contour():
+    # closed subpath with its edges bucketed in horizontal slabs,
+    # so that the point in polygon test only looks at a few edges
+
+    def __init__(self, sub):
+        self.box = sub.box()
+        self.area = (self.box[2] - self.box[0]) * (self.box[3] - self.box[1])
+        self.sub = sub
+        self.slabs = None
+
+    def build(self):
+        points = polygon(self.sub)
+        count = max(len(points) // 8, 1)
+        self.y0 = self.box[1]
+        self.height = max((self.box[3] - self.box[1]) / count, EPSILON)
+        self.slabs = [[] for i in range(count)]
+        for a, b in zip(points, points[1:] + points[:1]):
+            first = self.slab(min(a[1], b[1]))
+            last = self.slab(max(a[1], b[1]))
+            for i in range(first, last + 1):
+                self.slabs[i].append((a, b))
+
+    def slab(self, y):
+        return min(max(int((y - self.y0) / self.height), 0), len(self.slabs) - 1)
+
+    def contains(self, x, y):
+        # even-odd ray casting towards +x
+        if self.slabs is None:
+            self.build()
+        inside = False
+        for a, b in self.slabs[self.slab(y)]:
+            if (a[1] > y) != (b[1] > y):
+                if x < a[0] + (y - a[1]) * (b[0] - a[0]) / (b[1] - a[1]):
+                    inside = not inside
+        return inside
+
+def containment_depth(subs):
+    # number of closed subpaths around each subpath, found through an R-tree
+    # of the closed ones instead of testing all the pairs
+    contours = {}
+    boxes = []
+    for k, sub in enumerate(subs):
+        if is_closed(sub) and sub.count > 1:
+            contours[k] = c = Contour(sub)
+            boxes.append(c.box + (k,))
+    tree = BoxTree(boxes)
+    depth = []
+    for k, sub in enumerate(subs):
+        inner = contours.get(k) or Contour(sub)
+        x, y = sub.begin()
+        count = 0
+        for j in tree.search(x, y):
+            if j == k:
+                continue
+            outer = contours[j]
+            if outer.area < inner.area or (outer.area == inner.area and j > k):
+                continue
+            b, o = inner.box, outer.box
+            if o[0] <= b[0] and o[1] <= b[1] and b[2] <= o[2] and b[3] <= o[3] and outer.contains(x, y):
+                count += 1
+        depth.append(count)
+    return depth
+
+def order_inside_first(paths, origin=(0.0, 0.0), optimize=False, window=TWO_OPT_WINDOW):
+    # innermost subpaths first, so that parts do not drop before their holes are cut;
+    # with optimize, each level of nesting is reordered as by optimize_travel()
+    subs = flatten(paths)
+    before = travel_length(subs, origin)
+    depth = containment_depth(subs)
+    levels = {}
+    for d, sub in zip(depth, subs):
+        levels.setdefault(d, []).append(sub)
+    ordered = PathList()
+    position = origin
+    for d in sorted(levels, reverse=True):
+        level = levels[d]
+        if optimize and len(level) > 1:
+            tour = nearest_neighbour(level, position)
+            tour = two_opt(level, tour, position, window)
+            position = place(level, tour, position, ordered)
+        else:
+            for sub in level:
+                position = ordered.add(sub)
+    ordered = ordered.end()
+    return ordered, before, travel_length(flatten(ordered), origin)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
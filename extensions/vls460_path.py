@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_path.py
+Compact paths: flat arrays of coordinates, transformed and rounded in bulk,
+and handed to GDI without copying the points one by one.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+A cubicsuperpath node is three [x, y] lists, some 400 bytes per point; here a
+point takes 16 bytes and a straight segment carries no control points.
+NumPy, when available, works directly on the array buffers.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from array import array
+from ctypes import c_int32
+from itertools import groupby
+from math import hypot
+# numpy is optional, it only makes things faster
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LINE = 0 # segment kinds
+CURVE = 1
+MAX_SUBDIVISIONS = 16 # when flattening a curve
+KAPPA = 0.5522847498 # distance of the control points of a quarter of a circle, per radius
+
+def point_buffer(points, start, count):
+    # ctypes view on count points of a rounded() buffer, no copy
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        address = points.ctypes.data
+    else:
+        address = points.buffer_info()[0]
+    return (c_int32 * (2*count)).from_address(address + 8*start)
+
+def join_points(pieces):
+    # one rounded() buffer from (points, start, count) pieces
+    if len(pieces) == 1:
+        points, start, count = pieces[0]
+        return points, start
+    if numpy is not None and isinstance(pieces[0][0], numpy.ndarray):
+        return numpy.concatenate([p[2*s:2*(s + n)] for p, s, n in pieces]), 0
+    joined = array('i')
+    for p, s, n in pieces:
+        joined.extend(p[2*s:2*(s + n)])
+    return joined, 0
+
+class CompactPath(object):
+    # coords: x, y of the points, for each subpath its start point then the
+    #   end point of a LINE segment or control_out, control_in and end point
+    #   of a CURVE segment
+    # kinds: LINE or CURVE of each segment
+    # counts: number of segments of each subpath
+    # Iterating gives the subpaths in the cubicsuperpath format.
+    __slots__ = ('coords', 'kinds', 'counts')
+
+    def __init__(self, coords=None, kinds=None, counts=None):
+        self.coords = coords if coords is not None else array('d')
+        self.kinds = kinds if kinds is not None else array('b')
+        self.counts = counts if counts is not None else array('l')
+
+    # without them, __slots__ classes only pickle with protocol 2 and more
+    def __getstate__(self):
+        return self.coords, self.kinds, self.counts
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @classmethod
+    def from_superpath(cls, p):
+        path = cls()
+        coords = path.coords
+        kinds = path.kinds
+        for sub in p:
+            if len(sub) < 2:
+                continue
+            coords.extend(sub[0][1])
+            for i in range(len(sub) - 1):
+                p0, c1, c2, p1 = sub[i][1], sub[i][2], sub[i + 1][0], sub[i + 1][1]
+                if c1[0] == p0[0] and c1[1] == p0[1] and c2[0] == p1[0] and c2[1] == p1[1]:
+                    kinds.append(LINE)
+                else:
+                    coords.extend(c1)
+                    coords.extend(c2)
+                    kinds.append(CURVE)
+                coords.extend(p1)
+            path.counts.append(len(sub) - 1)
+        return path
+
+    @classmethod
+    def rectangle(cls, x, y, width, height):
+        return cls(
+            array('d', [x, y, x + width, y, x + width, y + height, x, y + height, x, y]),
+            array('b', [LINE]*4),
+            array('l', [4]))
+
+    @classmethod
+    def polyline(cls, points, closed=False):
+        # points: flat x, y sequence; closed goes back to the first point (polygon)
+        coords = array('d', points[:len(points) // 2 * 2])
+        if closed:
+            coords.extend(coords[:2])
+        segments = len(coords) // 2 - 1
+        if segments < 1:
+            return cls()
+        return cls(coords, array('b', [LINE]*segments), array('l', [segments]))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def copy(self):
+        return CompactPath(self.coords[:], self.kinds[:], self.counts[:])
+
+    def subpaths(self):
+        # (first point, number of points, first segment, number of segments) of each subpath
+        start = 0
+        first = 0
+        for count in self.counts:
+            curves = self.kinds[first:first + count].count(CURVE)
+            points = 1 + count + 2*curves
+            yield start, points, first, count
+            start += points
+            first += count
+
+    def __iter__(self):
+        c = self.coords
+        for start, points, first, count in self.subpaths():
+            i = 2*start
+            point = [c[i], c[i + 1]]
+            sub = [[point, point, point]]
+            for kind in self.kinds[first:first + count]:
+                if kind == CURVE:
+                    sub[-1][2] = [c[i + 2], c[i + 3]]
+                    control = [c[i + 4], c[i + 5]]
+                    i += 6
+                else:
+                    i += 2
+                point = [c[i], c[i + 1]]
+                sub.append([control if kind == CURVE else point, point, point])
+            yield sub
+
+    def points(self):
+        return len(self.coords) // 2
+
+    def bounds(self):
+        # (left, top, right, bottom) of the points, control points included,
+        # so it holds the curves; None for an empty path
+        c = self.coords
+        if not len(c):
+            return None
+        if numpy is not None:
+            v = numpy.frombuffer(c, dtype=numpy.float64).reshape(-1, 2)
+            (x0, y0), (x1, y1) = v.min(axis=0), v.max(axis=0)
+            return float(x0), float(y0), float(x1), float(y1)
+        return min(c[0::2]), min(c[1::2]), max(c[0::2]), max(c[1::2])
+
+    def transform(self, mat):
+        # mat is a simpletransform 2x3 matrix, applied in place
+        (a, c, e), (b, d, f) = mat
+        if numpy is not None:
+            v = numpy.frombuffer(self.coords, dtype=numpy.float64).reshape(-1, 2)
+            v[:] = v.dot(numpy.array([[a, b], [c, d]])) + (e, f)
+            return
+        xs = self.coords[0::2]
+        ys = self.coords[1::2]
+        self.coords[0::2] = array('d', [a*x + c*y + e for x, y in zip(xs, ys)])
+        self.coords[1::2] = array('d', [b*x + d*y + f for x, y in zip(xs, ys)])
+
+    def rounded(self):
+        # flat int32 x, y buffer, as GDI wants its POINTs
+        if numpy is not None:
+            return numpy.rint(numpy.frombuffer(self.coords, dtype=numpy.float64)).astype(numpy.int32)
+        return array('i', [int(round(v)) for v in self.coords])
+
+    def segments(self, start, first, count):
+        # (kind, first point, number of segments) of each run of segments
+        # of the same kind in a subpath, after its start point
+        i = start + 1
+        for kind, run in groupby(self.kinds[first:first + count]):
+            n = len(list(run))
+            yield kind, i, n
+            i += 3*n if kind == CURVE else n
+
+    def simplify(self, tolerance, flatten=False):
+        # new path: curves within tolerance of their chord become lines, or all
+        # the curves are flattened in lines, then runs of lines are thinned out
+        # by Douglas-Peucker; the tolerance is in the units of the coordinates
+        path = CompactPath()
+        c = self.coords
+        for start, points, first, count in self.subpaths():
+            i = 2*start
+            run = [(c[i], c[i + 1])]
+            segments = 0
+            for kind in self.kinds[first:first + count]:
+                if kind == LINE:
+                    run.append((c[i + 2], c[i + 3]))
+                    i += 2
+                    continue
+                p0, c1, c2, p1 = run[-1], (c[i + 2], c[i + 3]), (c[i + 4], c[i + 5]), (c[i + 6], c[i + 7])
+                i += 6
+                if is_flat(p0, c1, c2, p1, tolerance):
+                    run.append(p1)
+                elif flatten:
+                    run.extend(flatten_curve(p0, c1, c2, p1, tolerance))
+                else:
+                    segments += path.add_lines(douglas_peucker(run, tolerance), segments == 0)
+                    path.add_curve(c1, c2, p1)
+                    segments += 1
+                    run = [p1]
+            segments += path.add_lines(douglas_peucker(run, tolerance), segments == 0)
+            path.counts.append(segments)
+        return path
+
+    def add_lines(self, run, move):
+        # append run as LINE segments, starting with its first point when move
+        if move:
+            self.coords.extend(run[0])
+        for point in run[1:]:
+            self.coords.extend(point)
+            self.kinds.append(LINE)
+        return len(run) - 1
+
+    def add_curve(self, c1, c2, p1):
+        self.coords.extend(c1)
+        self.coords.extend(c2)
+        self.coords.extend(p1)
+        self.kinds.append(CURVE)
+
+class EllipsePath(CompactPath):
+    # an ellipse as four curves, and its (left, top, right, bottom) box as
+    # long as its axes stay parallel to the page: GdiPrinter then draws it
+    # with the GDI Ellipse or Arc functions, box None draws the curves
+    __slots__ = ('box',)
+
+    def __init__(self, coords=None, kinds=None, counts=None, box=None):
+        CompactPath.__init__(self, coords, kinds, counts)
+        self.box = box
+
+    def __getstate__(self):
+        return self.coords, self.kinds, self.counts, self.box
+
+    @classmethod
+    def centered(cls, cx, cy, rx, ry):
+        kx, ky = KAPPA*rx, KAPPA*ry
+        return cls(array('d', [
+            cx + rx, cy,
+            cx + rx, cy + ky, cx + kx, cy + ry, cx, cy + ry,
+            cx - kx, cy + ry, cx - rx, cy + ky, cx - rx, cy,
+            cx - rx, cy - ky, cx - kx, cy - ry, cx, cy - ry,
+            cx + kx, cy - ry, cx + rx, cy - ky, cx + rx, cy,
+        ]), array('b', [CURVE]*4), array('l', [4]), (cx - rx, cy - ry, cx + rx, cy + ry))
+
+    def copy(self):
+        return EllipsePath(self.coords[:], self.kinds[:], self.counts[:], self.box)
+
+    def transform(self, mat):
+        CompactPath.transform(self, mat)
+        if self.box is None:
+            return
+        (a, c, e), (b, d, f) = mat
+        if b == 0 and c == 0 or a == 0 and d == 0:
+            # scaled, flipped or turned by a quarter: the box follows
+            x0, y0, x1, y1 = self.box
+            xs = (a*x0 + c*y0 + e, a*x1 + c*y1 + e)
+            ys = (b*x0 + d*y0 + f, b*x1 + d*y1 + f)
+            self.box = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            self.box = None
+
+    def simplify(self, tolerance, flatten=False):
+        # GDI draws the ellipse exactly, unless all the curves must be lines
+        if self.box is not None and not flatten:
+            return self
+        return CompactPath.simplify(self, tolerance, flatten)
+
+class Subpath(object):
+    # a subpath of a CompactPath, by its place in the arrays of the path, as
+    # given by CompactPath.subpaths(); nothing is copied until append_to()
+    __slots__ = ('path', 'start', 'points', 'first', 'count')
+
+    def __init__(self, path, start, points, first, count):
+        self.path = path
+        self.start = start
+        self.points = points
+        self.first = first
+        self.count = count
+
+    def point(self, i):
+        c = self.path.coords
+        i = 2*(self.start + i)
+        return c[i], c[i + 1]
+
+    def begin(self):
+        return self.point(0)
+
+    def end(self):
+        return self.point(self.points - 1)
+
+    def kinds(self):
+        return self.path.kinds[self.first:self.first + self.count]
+
+    def nodes(self):
+        # index of the first point of each segment
+        nodes = []
+        i = 0
+        for kind in self.kinds():
+            nodes.append(i)
+            i += 3 if kind == CURVE else 1
+        return nodes
+
+    def box(self):
+        # box of the points, control points included, which holds the subpath
+        c = self.path.coords[2*self.start:2*(self.start + self.points)]
+        return min(c[0::2]), min(c[1::2]), max(c[0::2]), max(c[1::2])
+
+    def append_to(self, path, flip=False, segment=0):
+        # copy to the end of path, reversed with flip, or for a closed
+        # subpath starting at its segment-th segment; returns its end point
+        c = self.path.coords[2*self.start:2*(self.start + self.points)]
+        kinds = self.kinds()
+        if flip:
+            xs, ys = c[0::2], c[1::2]
+            xs.reverse()
+            ys.reverse()
+            c[0::2], c[1::2] = xs, ys
+            kinds.reverse()
+        elif segment:
+            # the last point is the first one again
+            i = 2*self.nodes()[segment]
+            c = c[i:] + c[2:i + 2]
+            kinds = kinds[segment:] + kinds[:segment]
+        path.coords.extend(c)
+        path.kinds.extend(kinds)
+        path.counts.append(self.count)
+        return c[-2], c[-1]
+
+def segment_distance(p, a, b):
+    # distance from p to the segment a-b
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    d2 = dx*dx + dy*dy
+    t = 0.0 if d2 == 0 else max(0.0, min(1.0, ((p[0] - a[0])*dx + (p[1] - a[1])*dy) / d2))
+    return hypot(p[0] - a[0] - t*dx, p[1] - a[1] - t*dy)
+
+def is_flat(p0, c1, c2, p1, tolerance):
+    # the curve lies in the hull of its control points
+    return segment_distance(c1, p0, p1) <= tolerance and segment_distance(c2, p0, p1) <= tolerance
+
+def flatten_curve(p0, c1, c2, p1, tolerance):
+    # points after p0 of a polyline within tolerance of the curve, by de Casteljau subdivision
+    points = []
+    stack = [(p0, c1, c2, p1, 0)]
+    while stack:
+        p0, c1, c2, p1, depth = stack.pop()
+        if depth >= MAX_SUBDIVISIONS or is_flat(p0, c1, c2, p1, tolerance):
+            points.append(p1)
+            continue
+        m01 = mid(p0, c1)
+        m12 = mid(c1, c2)
+        m23 = mid(c2, p1)
+        a = mid(m01, m12)
+        b = mid(m12, m23)
+        m = mid(a, b)
+        # second half first, the stack pops the first half next
+        stack.append((m, b, m23, p1, depth + 1))
+        stack.append((p0, m01, a, m, depth + 1))
+    return points
+
+def mid(a, b):
+    return ((a[0] + b[0]) / 2.0, (a[1] + b[1]) / 2.0)
+
+def douglas_peucker(points, tolerance):
+    if len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, index = -1.0, None
+        for i in range(first + 1, last):
+            d = segment_distance(points[i], points[first], points[last])
+            if d > worst:
+                worst, index = d, i
+        if index is not None and worst > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_prepare.py
+Prepare the shapes (parse, transform, simplify) in worker processes, then
+hand them back in the document order.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+The traversal and the style resolution stay in the main process. Each shape
+goes to the workers as a work item: a (PATH, d), (RECT, (x, y, w, h)),
+(ELLIPSE, (cx, cy, rx, ry)), (POLYLINE, points) or (POLYGON, points) to parse,
+or an already parsed CompactPath (clones), with its matrix. Items are
+sent in chunks, and only a few chunks are in flight, so memory stays bounded.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import deque
+import multiprocessing
+# the futures backport may be missing on Python 2
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    ProcessPoolExecutor = None
+# local library
+import cubicsuperpath
+from vls460_path import CompactPath, EllipsePath
+
+PATH = 0 # kinds of work items
+RECT = 1
+ELLIPSE = 2
+POLYLINE = 3
+POLYGON = 4
+CHUNK_SIZE = 500 # shapes per chunk
+CHUNKS_PER_WORKER = 2 # chunks in flight per worker
+
+def parse_shape(shape):
+    if isinstance(shape, CompactPath):
+        return shape
+    kind, data = shape
+    if kind == PATH:
+        return CompactPath.from_superpath(cubicsuperpath.parsePath(data))
+    if kind == RECT:
+        return CompactPath.rectangle(*data)
+    if kind == ELLIPSE:
+        return EllipsePath.centered(*data)
+    return CompactPath.polyline(data, kind == POLYGON)
+
+def prepare(shape, mat, tolerance, flatten):
+    # the path of a shape in printer pixels
+    p = parse_shape(shape)
+    p.transform(mat)
+    if tolerance:
+        p = p.simplify(tolerance, flatten)
+    return p
+
+def prepare_chunk(chunk):
+    tolerance, flatten, items = chunk
+    return [prepare(shape, mat, tolerance, flatten) for shape, mat in items]
+
+class PoolExecutor():
+    # what is used of ProcessPoolExecutor, on multiprocessing.Pool
+
+    def __init__(self, workers):
+        self.pool = multiprocessing.Pool(workers)
+
+    def submit(self, fn, *args):
+        r = self.pool.apply_async(fn, args)
+        r.result = r.get
+        return r
+
+    def shutdown(self):
+        self.pool.close()
+        self.pool.join()
+
+class ShapePool():
+    # add() the shapes with their style, emit(p, *style) is called with the
+    # prepared paths in the same order; a shape added with mat None is
+    # already prepared, e.g. read from the cache
+
+    def __init__(self, workers, tolerance, flatten, emit, chunk=CHUNK_SIZE):
+        if ProcessPoolExecutor is not None:
+            self.executor = ProcessPoolExecutor(workers)
+        else:
+            self.executor = PoolExecutor(workers)
+        self.tolerance = tolerance
+        self.flatten = flatten
+        self.emit = emit
+        self.chunk = chunk
+        self.inflight = workers * CHUNKS_PER_WORKER
+        self.items = [] # shapes to prepare
+        self.entries = [] # (prepared path or None, style) of each shape
+        self.futures = deque()
+
+    def add(self, shape, mat, style):
+        if mat is None:
+            self.entries.append((shape, style))
+        else:
+            self.items.append((shape, mat))
+            self.entries.append((None, style))
+        if len(self.entries) >= self.chunk:
+            self.submit()
+
+    def submit(self):
+        if self.entries:
+            future = None
+            if self.items:
+                future = self.executor.submit(prepare_chunk, (self.tolerance, self.flatten, self.items))
+            self.futures.append((future, self.entries))
+            self.items = []
+            self.entries = []
+        while len(self.futures) > self.inflight:
+            self.receive()
+
+    def receive(self):
+        future, entries = self.futures.popleft()
+        prepared = iter(future.result() if future is not None else ())
+        for p, style in entries:
+            self.emit(p if p is not None else next(prepared), *style)
+
+    def close(self):
+        self.submit()
+        while self.futures:
+            self.receive()
+        self.executor.shutdown()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
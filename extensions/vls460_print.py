@@ -24,28 +24,184 @@ You should have received a copy of the GNU General Public License
 along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 '''
+# standard library
+from collections import OrderedDict
+import copy
+from multiprocessing import AuthenticationError
+import os
+import re
+import shutil
+import sys
 # local library
 import inkex
 # from inkex.elements import ShapeElement
-import simplestyle
 import simpletransform
-import cubicsuperpath
-from vls460_gdi import GdiPrinter
+from vls460_gdi import GdiPrinter, RecordingBackend, Win32Backend
+from vls460_cache import GeometryCache, shape_key
+from vls460_clip import clip_path, contains, overlaps, read_page
+from vls460_daemon import KEY_FILE, spool_file, submit
+from vls460_estimate import DEFAULT_DPI, JobEstimate
+from vls460_job import JobReader, JobWriter, devmode_dpi, devmode_orientation, replay
+from vls460_path import CompactPath
+from vls460_profile import PrinterProfile
+from vls460_progress import ProgressLog
+from vls460_raster import DITHERS, RasterImage, can_rasterize, load_image, placement
+from vls460_prepare import ELLIPSE, PATH, POLYGON, POLYLINE, RECT, ShapePool, parse_shape, prepare
+from vls460_stats import CountingBackend, Stats
+from vls460_util import LruCache
+from vls460_style import STYLE_CACHE, StyleStack, colorref, parse_style
+from vls460_batch import ColorBatch
+from vls460_dedup import remove_duplicates
+from vls460_order import flatten, optimize_travel, order_inside_first, travel_length
 
 inkex.localize() # Initialize gettext
-if not inkex.sys.platform.startswith('win'):
-    exit(_("sorry, this will run only on Windows, exiting..."))
+
+TEMPLATE_CACHE = 1024 # clone templates kept
+INHERITED = ('stroke', 'stroke-width', 'fill') # the group styles a shape depends on
+STREAM_BATCH = 10000 # paths grouped at most by color before they are sent, when streaming
+NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?') # in a points attribute
 
 class Vls460Printer(inkex.Effect):
     def __init__(self):
         inkex.Effect.__init__(self)
         self.not_converted = []
-        self.groupstyle = {}
+        self.groupstyle = StyleStack()
+        self.widths = LruCache(STYLE_CACHE) # stroke-width -> pen width
+        self.batch = None
+        self.travel = [0.0, 0.0] # head moves before and after optimize_travel
+        self.saved = 0.0 # duplicate cut length removed
+        self.tolerance = 0.0 # simplification tolerance in printer pixels
+        self.visibleLayers = True # skip the hidden layers
+        self.references = None # id -> element, for svg:use
+        self.complete = None # ids of the referenced elements read with all theirs, when streaming
+        self.templates = LruCache(TEMPLATE_CACHE) # (id, group style) -> shapes of a referenced element
+        self.template = None # shapes of the template being built
+        self.pool = None # worker processes preparing the shapes
+        self.cache = None # prepared paths kept on disk
+        self.cache_salt = None # what else the prepared paths depend on
+        self.estimate = None # vls460_estimate.JobEstimate
+        self.stats = None # vls460_stats.Stats, with --stats-report
+        self.style_timer = None # vls460_stats.Timer of the styles of the shapes, with the stats
+        self.transform_timer = None # of their preparation
+        self.raster_missing = False # images found without PIL or NumPy
+        self.page = None # (left, top, right, bottom) of the bed in printer pixels, to clip to
+        self.culled = 0 # shapes off the page
+        self.culled_ids = OrderedDict() # ids of their elements, once each
+        self.clipped = 0 # shapes across its border
+        self.selection = None # ids of the elements to print, None for all
+        self.in_selection = 0 # selected groups around the current element
+        self.current_id = None # of the element being drawn, or of its clone
+        self.progress = None # vls460_progress.ProgressLog
+        self.resumed = 0 # shapes skipped, sent before
 
         self.OptionParser.add_option(
             '--ignore-stroke-width', type="inkbool", action='store',
             dest='ignoreStrokeWidth', default=True,
             help='Ignore stroke-width')
+        self.OptionParser.add_option(
+            '--simplify', type='choice', action='store',
+            dest='simplify', choices=['none', 'lines', 'flatten'], default='none',
+            help='Turn nearly straight curves (lines) or all curves (flatten) into simplified polylines')
+        self.OptionParser.add_option(
+            '--tolerance', type='float', action='store',
+            dest='tolerance', default=0.05,
+            help='Simplification tolerance in millimeters')
+        self.OptionParser.add_option(
+            '--stream', type="inkbool", action='store',
+            dest='stream', default=False,
+            help='Read the document as a stream instead of loading it, for very large files; the paths grouped by color are sent layer by layer')
+        self.OptionParser.add_option(
+            '--backend', type='choice', action='store',
+            dest='backend', choices=['gdi', 'record'], default='gdi',
+            help='Send to the printer (gdi) or only record the GDI calls (record)')
+        self.OptionParser.add_option(
+            '--group-colors', type="inkbool", action='store',
+            dest='groupColors', default=False,
+            help='Send the strokes grouped by color, and the fills of a same color next to each other together')
+        self.OptionParser.add_option(
+            '--remove-duplicates', type="inkbool", action='store',
+            dest='removeDuplicates', default=False,
+            help='Cut only once the segments shared by several paths (needs --group-colors)')
+        self.OptionParser.add_option(
+            '--optimize-travel', type="inkbool", action='store',
+            dest='optimizeTravel', default=False,
+            help='Reorder the cuts of each color to shorten the head moves (needs --group-colors)')
+        self.OptionParser.add_option(
+            '--inside-first', type="inkbool", action='store',
+            dest='insideFirst', default=False,
+            help='Cut the holes before the contours around them (needs --group-colors)')
+        self.OptionParser.add_option(
+            '--report-travel', type="inkbool", action='store',
+            dest='reportTravel', default=False,
+            help='Report the estimated head moves')
+        self.OptionParser.add_option(
+            '--workers', type='int', action='store',
+            dest='workers', default=0,
+            help='Processes preparing the shapes, 0 to prepare them in this process')
+        self.OptionParser.add_option(
+            '--cache-dir', type='string', action='store',
+            dest='cacheDir', default='',
+            help='Keep the prepared paths in this directory to send the same shapes faster')
+        self.OptionParser.add_option(
+            '--cache-size', type='int', action='store',
+            dest='cacheSize', default=256,
+            help='Size limit of the cache in megabytes')
+        self.OptionParser.add_option(
+            '--compile', type='string', action='store',
+            dest='compile', default='',
+            help='Save a job file to print later with vls460_job.py instead of printing')
+        self.OptionParser.add_option(
+            '--las', type='string', action='store',
+            dest='las', default='',
+            help='Laser settings (.las) file saved in the job file, instead of the ones of the profile')
+        self.OptionParser.add_option(
+            '--profile', type='string', action='store',
+            dest='profile', default='',
+            help='Printer profile: the printer settings are chosen once and then reused')
+        self.OptionParser.add_option(
+            '--printer-dialog', type="inkbool", action='store',
+            dest='printerDialog', default=False,
+            help='Show the printer properties dialog even when the profile has settings')
+        self.OptionParser.add_option(
+            '--daemon', type="inkbool", action='store',
+            dest='daemon', default=False,
+            help='Queue the job in vls460_daemon instead of printing it')
+        self.OptionParser.add_option(
+            '--estimate', type='choice', action='store',
+            dest='estimate', choices=['none', 'report', 'only'], default='none',
+            help='Estimate the laser time from the .las settings, and print (report) or not (only)')
+        self.OptionParser.add_option(
+            '--stats-report', type='string', action='store',
+            dest='statsReport', default='',
+            help='Save the time spent in each phase and the GDI calls made to this JSON file')
+        self.OptionParser.add_option(
+            '--clip-to-page', type="inkbool", action='store',
+            dest='clipToPage', default=True,
+            help='Skip the shapes off the page and clip the ones across its border')
+        self.OptionParser.add_option(
+            '--page-width', type='float', action='store',
+            dest='pageWidth', default=0.0,
+            help='Page width in mm, 0 for the PageWidth of the laser settings')
+        self.OptionParser.add_option(
+            '--page-height', type='float', action='store',
+            dest='pageHeight', default=0.0,
+            help='Page height in mm, 0 for the PageHeight of the laser settings')
+        self.OptionParser.add_option(
+            '--selection-only', type="inkbool", action='store',
+            dest='selectionOnly', default=False,
+            help='Print only the selected objects')
+        self.OptionParser.add_option(
+            '--progress-log', type='string', action='store',
+            dest='progressLog', default='',
+            help='Log the objects sent to the printer to this file')
+        self.OptionParser.add_option(
+            '--resume', type="inkbool", action='store',
+            dest='resume', default=False,
+            help='Skip the objects already sent, as logged in the progress log')
+        self.OptionParser.add_option(
+            '--dither', type='choice', action='store',
+            dest='dither', choices=DITHERS, default='diffusion',
+            help='How the images are made black and white: threshold, ordered or diffusion')
 
     def process_shape(self, node, mat):
         readStrokeWidth = not self.options.ignoreStrokeWidth
@@ -53,33 +209,54 @@ class Vls460Printer(inkex.Effect):
         fillcolor = None                # fill color
         stroke = 1                      # pen width in printer pixels
         # Very NB : If the pen width is greater than 1 then the output will Not be a vector output !
+        if self.style_timer is not None:
+            start = self.style_timer.start()
         node_style = node.get('style')
         if node_style:
-            style = self.groupstyle.copy()
-            style.update( simplestyle.parseStyle(node_style) )
-            if style.has_key('stroke'):
-                if style['stroke'] and style['stroke'] != 'none' and style['stroke'][0:3] != 'url':
-                    rgb = simplestyle.parseColor(style['stroke'])
-                    color = rgb[0] + 256*rgb[1] + 256*256*rgb[2]
-            if readStrokeWidth and style.has_key('stroke-width'):
-                stroke = self.unittouu(style['stroke-width'])/self.unittouu('1px')
-                stroke = int(stroke*self.scale)
-            if style.has_key('fill'):
-                if style['fill'] and style['fill'] != 'none' and style['fill'][0:3] != 'url':
-                    fill = simplestyle.parseColor(style['fill'])
-                    fillcolor = fill[0] + 256*fill[1] + 256*256*fill[2]
+            style = parse_style(node_style)
+            color = colorref(self.groupstyle.get('stroke', style))
+            if readStrokeWidth:
+                width = self.groupstyle.get('stroke-width', style)
+                if width is not None:
+                    stroke = self.stroke_width(width)
+            fillcolor = colorref(self.groupstyle.get('fill', style))
+        if self.style_timer is not None:
+            self.style_timer.stop(start)
         if node.tag == inkex.addNS('path','svg'):
             d = node.get('d')
             if not d:
                 self.not_converted.append(node.get('id'))
                 return
-            p = cubicsuperpath.parsePath(d)
+            shape = (PATH, d)
         elif node.tag == inkex.addNS('rect','svg'):
             x = float(node.get('x'))
             y = float(node.get('y'))
             width = float(node.get('width'))
             height = float(node.get('height'))
-            p = self.printer.rectangle_path(x, y, width, height)
+            shape = (RECT, (x, y, width, height))
+        elif node.tag == inkex.addNS('circle','svg') or node.tag == inkex.addNS('ellipse','svg'):
+            cx = float(node.get('cx', 0))
+            cy = float(node.get('cy', 0))
+            if node.tag == inkex.addNS('circle','svg'):
+                rx = ry = float(node.get('r', 0))
+            else:
+                rx = float(node.get('rx', 0))
+                ry = float(node.get('ry', 0))
+            if rx <= 0 or ry <= 0:
+                # not rendered
+                return
+            shape = (ELLIPSE, (cx, cy, rx, ry))
+        elif node.tag == inkex.addNS('line','svg'):
+            shape = (POLYLINE, tuple(float(node.get(name, 0)) for name in ('x1', 'y1', 'x2', 'y2')))
+        elif node.tag == inkex.addNS('polyline','svg') or node.tag == inkex.addNS('polygon','svg'):
+            points = tuple(float(v) for v in NUMBER.findall(node.get('points', '')))
+            if len(points) < 4:
+                self.not_converted.append(node.get('id'))
+                return
+            shape = (POLYGON if node.tag == inkex.addNS('polygon','svg') else POLYLINE, points)
+        elif node.tag == inkex.addNS('image','svg'):
+            self.process_image(node, mat)
+            return
         elif node.tag == inkex.addNS('defs','svg') or node.tag == inkex.addNS('metadata','svg'):
             # ignore svg:defs and svg:metadata
             return
@@ -92,10 +269,213 @@ class Vls460Printer(inkex.Effect):
         trans = node.get('transform')
         if trans:
             mat = simpletransform.composeTransform(mat, simpletransform.parseTransform(trans))
-        simpletransform.applyTransformToPath(mat, p)
-        self.printer.draw_path(p, color, stroke, fillcolor)
+        self.emit_shape(shape, mat, color, stroke, fillcolor)
+
+    def process_image(self, node, mat):
+        # bitmaps go to the printer at once, band by band, not through the batches
+        if not can_rasterize():
+            self.raster_missing = True
+            self.not_converted.append(node.get('id'))
+            return
+        if self.template is not None:
+            # clones of images are not supported
+            self.not_converted.append(node.get('id'))
+            return
+        absref = node.get(inkex.addNS('absref','sodipodi'))
+        try:
+            if absref and os.path.isfile(absref):
+                image = load_image(absref)
+            else:
+                image = load_image(node.get(inkex.addNS('href','xlink')) or node.get('href') or '',
+                    self.document.getroot().get(inkex.addNS('docbase','sodipodi')))
+            image.load()
+            x, y, width, height = placement(self.image_length(node.get('x'), 0),
+                self.image_length(node.get('y'), 0), self.image_length(node.get('width'), image.size[0]),
+                self.image_length(node.get('height'), image.size[1]), image.size,
+                node.get('preserveAspectRatio'))
+        except (IOError, ValueError):
+            self.not_converted.append(node.get('id'))
+            return
+        trans = node.get('transform')
+        if trans:
+            mat = simpletransform.composeTransform(mat, simpletransform.parseTransform(trans))
+        (a, c, e), (b, d, f) = mat
+        if b != 0 or c != 0:
+            # rotated or skewed images are not supported
+            self.not_converted.append(node.get('id'))
+            return
+        x0, x1 = sorted((a*x + e, a*(x + width) + e))
+        y0, y1 = sorted((d*y + f, d*(y + height) + f))
+        left, top = int(round(x0)), int(round(y0))
+        width, height = int(round(x1)) - left, int(round(y1)) - top
+        if width <= 0 or height <= 0:
+            return
+        if self.page is not None and not overlaps(self.page, (left, top, left + width, top + height)):
+            self.cull(self.current_id)
+            return
+        entry = None
+        if self.progress is not None:
+            entry = self.progress.entry(self.current_id, (left, top, width, height), mat)
+            if self.progress.skip(entry):
+                self.resumed += 1
+                return
+        if self.stats is not None:
+            self.stats.count('images')
+            start = self.stats.start()
+        for x, y, w, h, bits in RasterImage(image, left, top, width, height, a < 0, d < 0).bands(self.options.dither):
+            if self.page is None or overlaps(self.page, (x, y, x + w, y + h)):
+                self.printer.draw_band(x, y, w, h, bits)
+        if entry is not None:
+            self.progress.sent(entry)
+        if self.stats is not None:
+            self.stats.stop('raster', start)
+
+    def image_length(self, value, default):
+        # user units of an attribute of svg:image; ValueError for the
+        # percentages, of a viewport that is not tracked here
+        if value is None:
+            return float(default)
+        if value.strip().endswith('%'):
+            raise ValueError('relative length {}'.format(value))
+        return self.unittouu(value)
+
+    def stroke_width(self, width):
+        # pen width in printer pixels
+        stroke = self.widths.get(width)
+        if stroke is None:
+            stroke = int(self.unittouu(width)/self.unittouu('1px')*self.scale)
+            self.widths.put(width, stroke)
+        return stroke
+
+    def emit_shape(self, shape, mat, color, stroke, fillcolor):
+        # shape is a CompactPath, or a work item of vls460_prepare still to parse
+        if self.template is not None:
+            # building a clone template: keep the geometry untransformed
+            self.template.append((parse_shape(shape), mat, color, stroke, fillcolor))
+            return
+        entry = None
+        if self.progress is not None:
+            entry = self.progress.entry(self.current_id, shape, mat)
+            if self.progress.skip(entry):
+                self.resumed += 1
+                return
+        key = None
+        # an ellipse is four curves, and a cached one would be drawn as such
+        if self.cache is not None and not isinstance(shape, CompactPath) and shape[0] != ELLIPSE:
+            key = shape_key(shape, mat, self.cache_salt)
+            p = self.cache.get(key)
+            if p is not None:
+                if self.pool is not None:
+                    # behind the shapes still in the workers
+                    self.pool.add(p, None, (None, color, stroke, fillcolor, entry, self.current_id))
+                else:
+                    self.draw_path(p, color, stroke, fillcolor, entry, self.current_id)
+                return
+        if self.pool is not None:
+            self.pool.add(shape, mat, (key, color, stroke, fillcolor, entry, self.current_id))
+        else:
+            if self.transform_timer is not None:
+                start = self.transform_timer.start()
+            p = prepare(shape, mat, self.tolerance, self.options.simplify == 'flatten')
+            if self.transform_timer is not None:
+                self.transform_timer.stop(start)
+            self.emit_prepared(p, key, color, stroke, fillcolor, entry, self.current_id)
+
+    def emit_prepared(self, p, key, color, stroke, fillcolor, entry=None, id=None):
+        if key is not None:
+            self.cache.put(key, p)
+        self.draw_path(p, color, stroke, fillcolor, entry, id)
+
+    def cull(self, id):
+        # off the page: reported apart from the objects not converted, the
+        # shapes of a clone under its id
+        self.culled += 1
+        if id is not None:
+            self.culled_ids[id] = True
+
+    def draw_path(self, p, color, stroke, fillcolor, entry=None, id=None):
+        # entry: of the progress log, once the path is sent; id: of the element, when culled
+        if self.stats is not None:
+            self.stats.count('shapes')
+            self.stats.count('subpaths', len(p))
+            self.stats.count('points', p.points())
+        if entry is not None and self.batch is not None:
+            entry = self.batch.track(entry)
+        outline = p
+        if self.page is not None:
+            box = p.bounds()
+            if box is None or not overlaps(self.page, box):
+                self.cull(id)
+                return
+            if not contains(self.page, box):
+                self.clipped += 1
+                if color is not None:
+                    # the fill is left to GDI
+                    outline = clip_path(p, self.page, self.tolerance or 1.0)
+        if outline is not p:
+            if len(outline):
+                self.draw_path_as(outline, color, stroke, None, entry)
+            if fillcolor is not None:
+                self.draw_path_as(p, None, 1, fillcolor, entry)
+        else:
+            self.draw_path_as(p, color, stroke, fillcolor, entry)
+        if entry is not None:
+            if self.batch is None:
+                self.progress.sent(entry)
+            elif entry[1] == 0:
+                # nothing left to draw
+                self.progress.sent(entry[0])
+
+    def draw_path_as(self, p, color, stroke, fillcolor, entry=None):
+        # entry: tracked by the batch
+        if self.batch is None:
+            self.printer.draw_path(p, color, stroke, fillcolor)
+        else:
+            self.batch.add(p, color, stroke, fillcolor, entry)
+
+    def dedup_group(self, paths, key):
+        color, stroke, fillcolor = key
+        if color is None:
+            return paths
+        paths, saved = remove_duplicates(paths)
+        self.saved += saved
+        return paths
+
+    def order_group(self, paths, key):
+        color, stroke, fillcolor = key
+        if color is None:
+            # fills keep their document order, they cover each other
+            return paths
+        if self.options.insideFirst:
+            paths, before, after = order_inside_first(paths, optimize=self.options.optimizeTravel)
+        elif self.options.optimizeTravel:
+            paths, before, after = optimize_travel(paths)
+        else:
+            self.travel[0] += travel_length(flatten(paths))
+            return paths
+        self.travel[0] += before
+        self.travel[1] += after
+        return paths
+
+    def flush_batch(self):
+        if self.batch is not None and len(self.batch):
+            self.timed('flush', self.batch.flush)(self.printer)
+
+    def timed(self, name, function):
+        # function, timed as the phase name when there are stats
+        if self.stats is None:
+            return function
+        def call(*args):
+            start = self.stats.start()
+            try:
+                return function(*args)
+            finally:
+                self.stats.stop(name, start)
+        return call
 
     def process_clone(self, node):
+        if self.stats is not None:
+            self.stats.count('clones')
         trans = node.get('transform')
         x = node.get('x')
         y = node.get('y')
@@ -111,57 +491,296 @@ class Vls460Printer(inkex.Effect):
             self.groupmat.append(simpletransform.composeTransform(self.groupmat[-1], mat))
         # get referenced node
         refid = node.get(inkex.addNS('href','xlink'))
-        refnode = self.getElementById(refid[1:])
+        refnode = self.get_reference(refid[1:])
         if refnode is not None:
-            if refnode.tag == inkex.addNS('g','svg'):
-                self.process_group(refnode)
-            elif refnode.tag == inkex.addNS('use', 'svg'):
-                self.process_clone(refnode)
-            else:
-                self.process_shape(refnode, self.groupmat[-1])
+            self.draw_template(refid[1:], refnode)
         # pop transform
         if trans or x or y:
             self.groupmat.pop()
 
-    def process_group(self, group):
+    def draw_template(self, refid, refnode):
+        # The shapes of a referenced element are parsed and their style resolved
+        # once per group style around the clone; each clone then only composes
+        # its matrix and emits a copy of them.
+        key = (refid, self.groupstyle.key(INHERITED))
+        template = self.templates.get(key)
+        if template is None:
+            template = self.make_template(refnode)
+            self.templates.put(key, template)
+        mat = self.groupmat[-1]
+        for p, relmat, color, stroke, fillcolor in template:
+            self.emit_shape(p.copy(), simpletransform.composeTransform(mat, relmat), color, stroke, fillcolor)
+
+    def make_template(self, refnode):
+        # (untransformed path, matrix relative to the clone, color, stroke, fillcolor) of its shapes
+        if self.stats is not None:
+            self.stats.count('templates')
+        template, self.template = self.template, []
+        self.groupmat.append([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        self.process_node(refnode)
+        self.groupmat.pop()
+        template, self.template = self.template, template
+        return template
+
+    def get_reference(self, refid):
+        if self.references is None:
+            # id -> element index, built on the first clone
+            self.references = dict((el.get('id'), el)
+                for el in self.document.getroot().iter(tag=inkex.etree.Element) if el.get('id') is not None)
+        return self.references.get(refid)
+
+    def enter_group(self, group):
+        # stack the style and transform of a group, None for a hidden layer
         style = group.get('style')
         if style:
-            style = simplestyle.parseStyle(style)
+            style = parse_style(style)
 
         if group.get(inkex.addNS('groupmode', 'inkscape')) == 'layer':
             if style:
                 if style.has_key('display'):
                     if style['display'] == 'none' and self.visibleLayers:
-                        return
+                        return None
 
         #stack the style of each group
-        prevstyle = self.groupstyle.copy()
         if style:
-            self.groupstyle.update(style)
+            self.groupstyle.push(style)
 
         trans = group.get('transform')
         if trans:
             self.groupmat.append(simpletransform.composeTransform(self.groupmat[-1], simpletransform.parseTransform(trans)))
-        for node in group:
-            if node.tag == inkex.addNS('g','svg'):
-                self.process_group(node)
-            elif node.tag == inkex.addNS('use', 'svg'):
-                self.process_clone(node)
-            else:
-                self.process_shape(node, self.groupmat[-1])
+        selected = self.selection is not None and group.get('id') in self.selection
+        self.in_selection += selected
+        return bool(style), bool(trans), selected
+
+    def leave_group(self, state):
+        style, trans, selected = state
+        self.in_selection -= selected
         if trans:
             self.groupmat.pop()
 
         #pop the current group style
-        self.groupstyle = prevstyle
+        if style:
+            self.groupstyle.pop()
+
+    def process_group(self, group):
+        state = self.enter_group(group)
+        if state is None:
+            return
+        for node in group:
+            self.process_node(node)
+        self.leave_group(state)
+
+    def select_leaf(self, node):
+        # False for a shape or clone out of the selection, else it becomes
+        # the current element; the inside of a clone template is not selected
+        if self.template is not None:
+            return True
+        if self.selection is not None and not self.in_selection and node.get('id') not in self.selection:
+            return False
+        self.current_id = node.get('id')
+        return True
+
+    def process_node(self, node):
+        if node.tag == inkex.addNS('g','svg'):
+            self.process_group(node)
+        elif not self.select_leaf(node):
+            return
+        elif node.tag == inkex.addNS('use', 'svg'):
+            self.process_clone(node)
+        else:
+            self.process_shape(node, self.groupmat[-1])
+
+    def stream_references(self, filename):
+        # ids referenced by svg:use, found by a parser that builds no tree
+        class Collector():
+            def __init__(self):
+                self.refs = set()
+            def start(self, tag, attrib):
+                if tag == inkex.addNS('use', 'svg'):
+                    href = attrib.get(inkex.addNS('href', 'xlink'))
+                    if href and href.startswith('#'):
+                        self.refs.add(href[1:])
+            def end(self, tag):
+                pass
+            def data(self, data):
+                pass
+            def close(self):
+                return self.refs
+        return inkex.etree.parse(filename, inkex.etree.XMLParser(target=Collector(), huge_tree=True))
+
+    def process_stream(self, filename):
+        # Same walk as process_group(root), but along iterparse events with an
+        # explicit stack: each open element is a 'group' being walked, a 'leaf'
+        # (shape or clone) drawn at its end, or 'skip' (below a leaf or hidden).
+        # Elements are cleared once done, except the ones referenced by clones
+        # which are kept, and clones of elements not read yet, or of elements
+        # holding such clones, wait for the end.
+        refs = self.stream_references(filename)
+        self.references = {}
+        self.complete = set()
+        pending = []
+        stack = []
+        keep = 0 # open elements referenced by a clone
+        for event, node in inkex.etree.iterparse(filename, events=('start', 'end'), huge_tree=True):
+            if event == 'start':
+                referenced = node.get('id') in refs
+                keep += referenced
+                if stack and stack[-1][0] != 'group':
+                    kind, state = 'skip', None
+                elif not stack or node.tag == inkex.addNS('g','svg'):
+                    state = self.enter_group(node)
+                    kind = 'group' if state is not None else 'skip'
+                else:
+                    kind, state = 'leaf', None
+                stack.append((kind, state, referenced))
+                continue
+
+            kind, state, referenced = stack.pop()
+            if kind == 'group':
+                self.leave_group(state)
+                if len(stack) == 1:
+                    # end of a layer: send its colors
+                    self.flush_batch()
+            elif kind == 'leaf' and self.select_leaf(node):
+                if node.tag != inkex.addNS('use', 'svg'):
+                    self.process_shape(node, self.groupmat[-1])
+                elif self.resolved(node.get(inkex.addNS('href','xlink'), '#')[1:]):
+                    self.process_clone(node)
+                else:
+                    pending.append((copy.deepcopy(node), self.groupmat[-1], self.groupstyle.copy()))
+                if self.batch is not None and self.batch.paths >= STREAM_BATCH:
+                    self.flush_batch()
+            if referenced:
+                self.references[node.get('id')] = copy.deepcopy(node)
+                keep -= 1
+            if not keep and stack:
+                node.clear()
+                while node.getprevious() is not None:
+                    del node.getparent()[0]
+
+        # clones of elements found after them
+        for node, mat, style in pending:
+            self.groupstyle = style
+            self.groupmat.append(mat)
+            self.current_id = node.get('id')
+            self.process_clone(node)
+            self.groupmat.pop()
+
+    def resolved(self, refid, seen=()):
+        # True once the element refid and the ones its inner clones refer to
+        # are all read, when streaming
+        if refid in self.complete or refid in seen:
+            return True
+        refnode = self.references.get(refid)
+        if refnode is None:
+            return False
+        seen += (refid,)
+        for use in refnode.iter(inkex.addNS('use', 'svg')):
+            if not self.resolved(use.get(inkex.addNS('href','xlink'), '#')[1:], seen):
+                return False
+        self.complete.add(refid)
+        return True
+
+    def parse(self, filename=None):
+        if self.options.statsReport:
+            self.stats = Stats()
+            self.style_timer = self.stats.timer('style')
+            self.transform_timer = self.stats.timer('transform')
+        self.timed('parse', self.load)(filename)
+
+    def load(self, filename):
+        if not self.options.stream:
+            return inkex.Effect.parse(self, filename)
+        # only keep the root element, for the document units and size
+        for event, root in inkex.etree.iterparse(filename or self.svg_file, events=('start',)):
+            break
+        root = inkex.etree.Element(root.tag, dict(root.attrib), nsmap=root.nsmap)
+        self.document = inkex.etree.ElementTree(root)
+
+    def output(self):
+        if not self.options.stream:
+            return inkex.Effect.output(self)
+        # the document was not loaded: hand the file back to Inkscape unchanged
+        with open(self.svg_file, 'rb') as fh:
+            shutil.copyfileobj(fh, sys.stdout)
+
+    def submit_job(self, jobfile):
+        try:
+            inkex.errormsg(_('Job {} queued').format(submit(jobfile)))
+        except (IOError, OSError) as e:
+            # socket.error: no daemon running, print the job now
+            inkex.errormsg(_('Print server not available ({}), printing now').format(e))
+            self.print_job(jobfile)
+        except AuthenticationError:
+            # a daemon of another user, or started before the key changed
+            inkex.errormsg(_('Print server refused the key of {}, printing now').format(KEY_FILE))
+            self.print_job(jobfile)
+
+    def print_job(self, jobfile):
+        backend = RecordingBackend(log=False) if self.options.backend == 'record' else None
+        job = JobReader(jobfile)
+        printer = GdiPrinter(backend, job.devmode)
+        printer.create_document(job.docname)
+        replay(job, printer)
+        printer.close()
+        job.close()
+        os.remove(jobfile)
 
     def effect(self):
-        # Start GDI printing
-        self.printer = GdiPrinter()
+        if self.stats is not None:
+            start = self.stats.start()
+        # Start GDI printing, with the printer settings of the profile if any
+        profile = None
+        devmode = None
+        if self.options.profile:
+            profile = PrinterProfile(self.options.profile)
+            devmode = profile.devmode
+        las = profile.las if profile is not None else b''
+        if self.options.las:
+            with open(os.path.expanduser(self.options.las), 'rb') as fh:
+                las = fh.read()
+        dryrun = self.options.estimate == 'only'
+        jobfile = self.options.compile
+        if self.options.daemon and not jobfile and not dryrun:
+            jobfile = spool_file()
+        # a dry run, or a job with the settings of the profile, does not need the printer
+        if not dryrun and (not jobfile or devmode is None or self.options.printerDialog):
+            if self.options.backend == 'record':
+                # headless run, e.g. for benchmarks: only count the GDI calls
+                backend = RecordingBackend(log=False)
+            else:
+                backend = Win32Backend()
+            if self.stats is not None:
+                backend = CountingBackend(backend, self.stats.gdi)
+            self.printer = GdiPrinter(backend, devmode, self.options.printerDialog)
+            if self.stats is not None:
+                self.printer.stats = self.stats
+                self.printer.emit = self.stats.timer('emit')
+            devmode = self.printer.devmode
+            if profile is not None and devmode != profile.devmode:
+                profile.devmode = devmode
+                profile.save()
+            if jobfile:
+                self.printer.close_printer()
+        if jobfile and not dryrun:
+            # save the job with the printer settings, vls460_job.py or the daemon prints it
+            self.printer = JobWriter(jobfile, devmode, las)
+        if self.options.estimate != 'none':
+            dpi = devmode_dpi(devmode) if devmode is not None else DEFAULT_DPI
+            self.estimate = JobEstimate(dpi / 96.0, las, None if dryrun else self.printer)
+            self.printer = self.estimate
 
         # Create GDI document
         docname = self.document.getroot().xpath('@sodipodi:docname', namespaces=inkex.NSS) or ['VLS460 Inkscape document.svg']
         self.printer.create_document(docname[0])
+        if self.options.selectionOnly and self.options.ids:
+            self.selection = set(self.options.ids)
+        if self.options.progressLog:
+            self.progress = ProgressLog(os.path.expanduser(self.options.progressLog), docname[0], self.options.resume)
+            if self.progress.mismatch is not None:
+                inkex.errormsg(_('The progress log was written for "{}"').format(self.progress.mismatch))
+        elif self.options.resume:
+            inkex.errormsg(_('No progress log to resume from, everything is printed'))
         self.scale = self.printer.scale / self.unittouu('1px')
 
         # Recalculate the scale
@@ -175,18 +794,91 @@ class Vls460Printer(inkex.Effect):
                 viewBox2 = viewBox.split(' ')
             self.scale *= h / self.unittouu(self.addDocumentUnit(viewBox2[3]))
 
+        if self.options.simplify != 'none':
+            self.tolerance = self.unittouu('{}mm'.format(self.options.tolerance)) * self.scale
+        if self.options.clipToPage:
+            # the page of the options, else of the laser settings if any,
+            # turned as the printer settings say
+            page = read_page(las)
+            landscape = devmode_orientation(devmode) if devmode is not None else None
+            if page is not None and landscape is not None:
+                page = (max(page), min(page)) if landscape else (min(page), max(page))
+            if self.options.pageWidth > 0 and self.options.pageHeight > 0:
+                page = (self.options.pageWidth, self.options.pageHeight)
+            if page is not None:
+                mm = self.printer.scale * 96 / 25.4 # millimeters to printer pixels
+                self.page = (0.0, 0.0, page[0] * mm, page[1] * mm)
+
         # Init matrix, start processing the SVG document
         self.groupmat = [[[self.scale, 0.0, 0.0], [0.0, self.scale, 0.0]]]
-        self.process_group(doc)
+        if self.options.groupColors:
+            self.batch = ColorBatch()
+            if self.progress is not None:
+                self.batch.sent = self.progress.sent
+            if self.options.removeDuplicates:
+                self.batch.passes.append(self.timed('dedup', self.dedup_group))
+            if self.options.optimizeTravel or self.options.insideFirst or self.options.reportTravel:
+                self.batch.passes.append(self.timed('order', self.order_group))
+        if self.options.cacheDir:
+            self.cache = GeometryCache(self.options.cacheDir, self.options.cacheSize * 1024 * 1024)
+            self.cache_salt = (self.scale, self.tolerance, self.options.simplify)
+        if self.options.workers > 0:
+            self.pool = ShapePool(self.options.workers, self.tolerance,
+                self.options.simplify == 'flatten', self.emit_prepared)
+        if self.options.stream:
+            self.timed('traverse', self.process_stream)(self.svg_file)
+        else:
+            self.timed('traverse', self.process_group)(doc)
+        if self.pool is not None:
+            self.timed('workers', self.pool.close)()
+        if self.cache is not None:
+            self.cache.close()
+            if self.stats is not None:
+                self.stats.count('cache_hits', self.cache.hits)
+                self.stats.count('cache_misses', self.cache.misses)
+        self.flush_batch()
+        if self.progress is not None:
+            self.progress.close()
 
         # Send to printer
         self.printer.close()
+        if jobfile and self.options.daemon and not self.options.compile:
+            self.submit_job(jobfile)
 
         # Information message
+        if self.options.removeDuplicates and self.batch is not None:
+            mm = 25.4 / (self.printer.scale * 96) # printer pixels to millimeters
+            inkex.errormsg(_('Duplicate cuts removed: {:.0f} mm').format(self.saved * mm))
+        if self.options.reportTravel and self.batch is not None:
+            mm = 25.4 / (self.printer.scale * 96) # printer pixels to millimeters
+            if self.options.optimizeTravel or self.options.insideFirst:
+                inkex.errormsg(_('Estimated head moves: {:.0f} mm before, {:.0f} mm after reordering').format(
+                    self.travel[0] * mm, self.travel[1] * mm))
+            else:
+                inkex.errormsg(_('Estimated head moves: {:.0f} mm').format(self.travel[0] * mm))
+        if self.resumed:
+            inkex.errormsg(_('Resumed: {} objects already sent were skipped').format(self.resumed))
+        if self.culled or self.clipped:
+            inkex.errormsg(_('Off the page: {} shapes skipped, {} clipped').format(self.culled, self.clipped))
+            if self.culled_ids:
+                inkex.errormsg(_('Skipped IDs = ') + ','.join(self.culled_ids))
         if len(self.not_converted):
             inkex.errormsg(_('Total number of non-converted objects: {}').format(len(self.not_converted)))
             # return list of IDs in case the user needs to find a specific object
             inkex.errormsg('IDs = ' + ','.join(self.not_converted))
+        if self.raster_missing:
+            inkex.errormsg(_('The images need the PIL and NumPy Python modules'))
+        if self.estimate is not None:
+            inkex.errormsg(self.estimate.summary())
+        if self.stats is not None:
+            self.stats.stop('effect', start)
+            self.stats.count('not_converted', len(self.not_converted))
+            self.stats.count('culled', self.culled)
+            self.stats.count('clipped', self.clipped)
+            self.stats.count('resumed', self.resumed)
+            self.stats.write(self.options.statsReport,
+                estimate=self.estimate.report() if self.estimate is not None else None)
+            inkex.errormsg(_('Report saved to {}').format(self.options.statsReport))
 
 if __name__ == '__main__':
     e = Vls460Printer()
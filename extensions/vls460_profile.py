@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_profile.py
+Named printer profiles: the printer settings chosen once in the driver's
+properties dialog, and the laser settings (.las pen table), kept for the
+next jobs.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+A profile is a JSON file in PROFILE_DIR with the raw DEVMODE (base64) and the
+.las text. GdiPrinter checks the DEVMODE size against the driver before using
+it, and shows the dialog instead when they differ.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+import base64
+import json
+import os
+import re
+# local library
+from vls460_util import replace
+
+PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.vls460', 'profiles')
+
+class PrinterProfile():
+
+    def __init__(self, name, directory=PROFILE_DIR):
+        self.name = name
+        self.filename = os.path.join(directory, re.sub(r'[^\w.-]', '_', name) + '.json')
+        self.devmode = None # raw DEVMODE, None until chosen in the dialog
+        self.las = b'' # .las settings
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename) as fh:
+                profile = json.load(fh)
+        except (IOError, ValueError):
+            return False
+        if profile.get('devmode'):
+            self.devmode = base64.b64decode(profile['devmode'])
+        self.las = profile.get('las', u'').encode('utf-8')
+        return True
+
+    def save(self):
+        directory = os.path.dirname(self.filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        profile = {
+            'name': self.name,
+            'devmode': base64.b64encode(self.devmode).decode('ascii') if self.devmode else None,
+            'las': self.las.decode('utf-8'),
+        }
+        with open(self.filename + '.tmp', 'w') as fh:
+            json.dump(profile, fh, indent=1, sort_keys=True)
+        replace(self.filename + '.tmp', self.filename)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
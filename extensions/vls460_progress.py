@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_progress.py
+Progress log of a job: the shapes sent to the printer, to send only the
+remainder of an interrupted job.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+A text file: the document name on a '#' line, then one line per shape sent,
+the id of its element (or of the clone drawing it) and the hash of its
+geometry and matrix, in the order they were sent. The lines are written as
+soon as the shapes go to the printer; with the paths grouped by color, once
+the last group of the shape is drawn, so in the order of the groups. Resuming
+skips the shapes of the log and appends the new ones. To send again what the
+laser did not cut, remove the lines of these shapes from the end of the log
+before resuming.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import Counter
+import hashlib
+import os
+# local library
+from vls460_path import CompactPath
+
+def native(s):
+    # ids and names as written to the log, utf-8 on Python 2
+    return s if isinstance(s, str) else s.encode('utf-8')
+
+def geometry_hash(shape, mat):
+    # shape: a work item of vls460_prepare or an untransformed CompactPath
+    if isinstance(shape, CompactPath):
+        data = shape.coords.tostring() + shape.kinds.tostring()
+    else:
+        data = repr(shape).encode('utf-8')
+    return hashlib.sha1(data + repr(mat).encode('utf-8')).hexdigest()
+
+class ProgressLog():
+
+    def __init__(self, filename, docname, resume=False):
+        self.docname = native(docname)
+        self.done = Counter() # entries of the log not met again yet
+        self.mismatch = None # document name of a log of another document
+        if resume and os.path.exists(filename):
+            self.read(filename)
+            self.fh = open(filename, 'a')
+        else:
+            directory = os.path.dirname(filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.fh = open(filename, 'w')
+            self.fh.write('# {}\n'.format(self.docname))
+
+    def read(self, filename):
+        with open(filename) as fh:
+            for line in fh:
+                line = line.rstrip('\n')
+                if line.startswith('# '):
+                    if line[2:] != self.docname:
+                        self.mismatch = line[2:]
+                elif line:
+                    self.done[line] += 1
+
+    def entry(self, id, shape, mat):
+        return '{} {}'.format(native(id or ''), geometry_hash(shape, mat))
+
+    def skip(self, entry):
+        # True for a shape already sent, each entry of the log skips one shape
+        if self.done[entry] > 0:
+            self.done[entry] -= 1
+            return True
+        return False
+
+    def sent(self, entry):
+        self.fh.write(entry + '\n')
+        self.fh.flush()
+
+    def close(self):
+        self.fh.close()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_raster.py
+Bitmaps for the laser: svg:image decoded, resampled to the printer
+resolution, dithered to black and white, and cut in bands of 1 bpp DIB.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+PIL decodes the images, NumPy does the rest; both are optional, without them
+the images are reported as not converted. Only BAND_PIXELS printer pixels
+are resampled and dithered at a time, so a bed sized image at 1000 DPI does
+not need a bitmap of its own size:
+- threshold: black below mid gray,
+- ordered: 8x8 Bayer matrix, along the rows of the whole image,
+- diffusion: Floyd-Steinberg, the error of the last row carried to the next
+  band. A pixel only depends on its left and upper neighbours, so the pixels
+  on a same line x + 2*y are diffused together.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+import base64
+import binascii
+import io
+import os
+try:
+    from urllib import unquote
+except ImportError:
+    from urllib.parse import unquote
+# PIL and numpy are optional, only needed for the images
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DITHERS = ['threshold', 'ordered', 'diffusion']
+BAND_PIXELS = 1 << 22 # printer pixels per band
+WHITE = 255
+
+def can_rasterize():
+    return Image is not None and numpy is not None
+
+def bayer(n):
+    # n x n ordered dither thresholds, from 0 to n*n - 1
+    m = numpy.zeros((1, 1), dtype=numpy.int32)
+    while len(m) < n:
+        m = numpy.vstack([numpy.hstack([4*m, 4*m + 2]), numpy.hstack([4*m + 3, 4*m + 1])])
+    return m
+
+def load_image(href, directory=None):
+    # PIL image of a data: URI or of a file, relative to directory; IOError
+    # or ValueError when it cannot be read
+    if href.startswith('data:'):
+        header, sep, data = href.partition(',')
+        if not header.endswith(';base64'):
+            raise ValueError('unsupported image data')
+        try:
+            data = base64.b64decode(data)
+        except (TypeError, binascii.Error):
+            # TypeError on Python 2
+            raise ValueError('malformed base64 image data')
+        return Image.open(io.BytesIO(data))
+    if href.startswith('file://'):
+        href = unquote(href[7:])
+        if os.name == 'nt' and href.startswith('/'):
+            href = href[1:] # file:///C:/...
+    if directory and not os.path.isabs(href):
+        href = os.path.join(directory, href)
+    return Image.open(href)
+
+def gray(image):
+    # 8 bits gray levels, transparent pixels white
+    if image.mode in ('RGBA', 'LA') or image.mode == 'P' and 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (WHITE, WHITE, WHITE, WHITE))
+        image = Image.alpha_composite(background, image)
+    return image.convert('L')
+
+def placement(x, y, width, height, size, preserve):
+    # (x, y, width, height) of the image in its viewport, as preserveAspectRatio
+    # says: 'none' stretches it, else it is fitted (meet) or covers (slice)
+    align, sep, mode = (preserve or 'xMidYMid').strip().partition(' ')
+    if align == 'none':
+        return x, y, width, height
+    sw, sh = size
+    scale = (max if mode == 'slice' else min)(width / float(sw), height / float(sh))
+    w, h = sw * scale, sh * scale
+    fx = {'xMin': 0.0, 'xMid': 0.5, 'xMax': 1.0}.get(align[:4], 0.5)
+    fy = {'YMin': 0.0, 'YMid': 0.5, 'YMax': 1.0}.get(align[4:], 0.5)
+    return x + (width - w) * fx, y + (height - h) * fy, w, h
+
+def resample(src, width, height, top, bottom):
+    # rows top to bottom of src scaled to width x height, bilinear
+    sh, sw = src.shape
+    y = (numpy.arange(top, bottom) + 0.5) * sh / float(height) - 0.5
+    x = (numpy.arange(width) + 0.5) * sw / float(width) - 0.5
+    y0 = numpy.clip(numpy.floor(y).astype(numpy.intp), 0, sh - 1)
+    x0 = numpy.clip(numpy.floor(x).astype(numpy.intp), 0, sw - 1)
+    fy = numpy.clip(y - y0, 0, 1).astype(numpy.float32)[:, None]
+    fx = numpy.clip(x - x0, 0, 1).astype(numpy.float32)
+    y1 = numpy.minimum(y0 + 1, sh - 1)
+    x1 = numpy.minimum(x0 + 1, sw - 1)
+    rows = src[y0] * (1 - fy) + src[y1] * fy
+    return rows[:, x0] * (1 - fx) + rows[:, x1] * fx
+
+class RasterImage():
+    # a gray image on the page, between left, top and left + width,
+    # top + height in printer pixels; bands() gives it as 1 bpp DIB bands
+
+    def __init__(self, image, left, top, width, height, flipx=False, flipy=False):
+        if image.size[0] > width or image.size[1] > height:
+            # reduced once by PIL, with a proper filter
+            image = image.resize((min(image.size[0], width), min(image.size[1], height)), Image.ANTIALIAS)
+        src = numpy.asarray(gray(image), dtype=numpy.float32)
+        if flipx:
+            src = src[:, ::-1]
+        if flipy:
+            src = src[::-1]
+        self.src = src
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+    def bands(self, dither='diffusion'):
+        # (x, y, width, height, bits) of each band, bits bottom-up with the
+        # rows padded to 32 bits as a DIB wants them; 0 is black
+        rows = max(1, BAND_PIXELS // self.width)
+        error = numpy.zeros(self.width + 2, dtype=numpy.float32)
+        for top in range(0, self.height, rows):
+            bottom = min(top + rows, self.height)
+            band = resample(self.src, self.width, self.height, top, bottom)
+            if dither == 'ordered':
+                white = self.ordered(band, top)
+            elif dither == 'diffusion':
+                white, error = self.diffuse(band, error)
+            else:
+                white = band >= 128
+            bits = numpy.packbits(white, axis=1)
+            stride = (bits.shape[1] + 3) // 4 * 4
+            dib = numpy.zeros((bottom - top, stride), dtype=numpy.uint8)
+            dib[:, :bits.shape[1]] = bits
+            yield self.left, self.top + top, self.width, bottom - top, dib[::-1].tobytes()
+
+    def ordered(self, band, top):
+        m = bayer(8)
+        thresholds = (m + 0.5) * (256.0 / m.size)
+        rows = numpy.arange(top, top + band.shape[0]) % 8
+        cols = numpy.arange(band.shape[1]) % 8
+        return band >= thresholds[rows[:, None], cols]
+
+    def diffuse(self, band, carried):
+        # Floyd-Steinberg; error has a column of margin on each side, and its
+        # last row goes to the next band
+        n, width = band.shape
+        error = numpy.zeros((n + 1, width + 2), dtype=numpy.float32)
+        error[0] = carried
+        white = numpy.zeros((n, width), dtype=bool)
+        ys = numpy.arange(n)
+        for t in range(width + 2*(n - 1)):
+            # the pixels x = t - 2*y of the band
+            first = max(0, (t - width + 2) // 2)
+            last = min(n - 1, t // 2)
+            y = ys[first:last + 1]
+            x = t - 2*y
+            v = band[y, x] + error[y, x + 1]
+            w = v >= 128
+            white[y, x] = w
+            e = v - WHITE * w
+            error[y, x + 2] += e * (7 / 16.0)
+            error[y + 1, x] += e * (3 / 16.0)
+            error[y + 1, x + 1] += e * (5 / 16.0)
+            error[y + 1, x + 2] += e * (1 / 16.0)
+        return white, error[n]
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_stats.py
+Where the time of a job goes: wall and CPU time per phase, counts of shapes,
+subpaths, points and GDI calls, peak memory, saved as a JSON report.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+Phases nest: e.g. traverse includes style, transform (parsing, transforming
+and simplifying the paths) and emit when the shapes are not grouped, flush
+includes the dedup and order passes and emit. Each phase also counts how many
+times it was timed. The phases met once per shape (style, transform, emit)
+are Timers, which only add up the wall clock: reading the CPU time costs a
+system call per shape. The GDI calls are counted by CountingBackend, wrapped
+around the backend of GdiPrinter.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import Counter, OrderedDict
+from ctypes import POINTER, Structure, byref, c_size_t, c_ulong, c_void_p, sizeof
+import json
+import os
+import sys
+import time
+
+# process CPU time, with a finer resolution than os.times() where possible
+if hasattr(time, 'process_time'):
+    cpu_time = time.process_time
+elif sys.platform.startswith('win'):
+    def cpu_time():
+        t = os.times()
+        return t[0] + t[1]
+else:
+    cpu_time = time.clock
+
+# wall clock, fine enough for a single shape
+if hasattr(time, 'perf_counter'):
+    wall_time = time.perf_counter
+elif sys.platform.startswith('win'):
+    wall_time = time.clock
+else:
+    wall_time = time.time
+
+def peak_memory():
+    # peak resident memory of the process in bytes, None if unknown
+    if sys.platform.startswith('win'):
+        from ctypes import WinDLL
+        class PROCESS_MEMORY_COUNTERS(Structure):
+            _fields_ = [
+                ("cb", c_ulong),
+                ("PageFaultCount", c_ulong),
+                ("PeakWorkingSetSize", c_size_t),
+                ("WorkingSetSize", c_size_t),
+                ("QuotaPeakPagedPoolUsage", c_size_t),
+                ("QuotaPagedPoolUsage", c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", c_size_t),
+                ("QuotaNonPagedPoolUsage", c_size_t),
+                ("PagefileUsage", c_size_t),
+                ("PeakPagefileUsage", c_size_t),
+            ]
+        kernel32 = WinDLL('kernel32.dll')
+        kernel32.GetCurrentProcess.restype = c_void_p
+        psapi = WinDLL('psapi.dll')
+        psapi.GetProcessMemoryInfo.argtypes = [c_void_p, POINTER(PROCESS_MEMORY_COUNTERS), c_ulong]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes on Linux
+
+class Timer(object):
+    # a phase timed once per shape:
+    #     start = timer.start()
+    #     ...
+    #     timer.stop(start)
+    __slots__ = ('wall', 'times')
+
+    def __init__(self):
+        self.wall = 0.0
+        self.times = 0
+
+    def start(self):
+        return wall_time()
+
+    def stop(self, start):
+        self.wall += wall_time() - start
+        self.times += 1
+
+class Stats():
+
+    def __init__(self):
+        self.phases = OrderedDict() # name -> [wall, cpu, times]
+        self.timers = OrderedDict() # name -> Timer
+        self.counts = OrderedDict()
+        self.gdi = Counter() # GDI function -> calls, see CountingBackend
+
+    def start(self):
+        return time.time(), cpu_time()
+
+    def stop(self, name, start):
+        wall, cpu = start
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = [0.0, 0.0, 0]
+        phase[0] += time.time() - wall
+        phase[1] += cpu_time() - cpu
+        phase[2] += 1
+
+    def timer(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+        return timer
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def report(self):
+        phases = OrderedDict((name, {'wall': wall, 'cpu': cpu, 'times': times})
+            for name, (wall, cpu, times) in self.phases.items())
+        for name, timer in self.timers.items():
+            phases[name] = {'wall': timer.wall, 'cpu': None, 'times': timer.times}
+        return OrderedDict([
+            ('phases', phases),
+            ('counts', self.counts),
+            ('gdi', OrderedDict(sorted(self.gdi.items()))),
+            ('peak_memory', peak_memory()),
+        ])
+
+    def write(self, filename, **extra):
+        report = self.report()
+        report.update(extra)
+        with open(filename, 'w') as fh:
+            json.dump(report, fh, indent=1)
+
+class CountingLibrary():
+    # counts the calls to the functions of a DLL
+
+    def __init__(self, library, counts):
+        self.library = library
+        self.counts = counts
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        function = getattr(self.library, name)
+        counts = self.counts
+        def call(*args):
+            counts[name] += 1
+            return function(*args)
+        setattr(self, name, call)
+        return call
+
+class CountingBackend():
+    # a backend of GdiPrinter counting its calls in counts, a Counter
+
+    def __init__(self, backend, counts):
+        self.backend = backend
+        self.counts = counts
+        self.gdi = CountingLibrary(backend.gdi, counts)
+        self.spool = CountingLibrary(backend.spool, counts)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
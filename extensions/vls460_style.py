@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_style.py
+Style lookups without copying: parsed styles and colors are cached by their
+string, and the styles of the open groups are stacked rather than merged.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+Generated documents give most nodes the same few inline styles, so parsing
+each distinct string once saves most of the style work. The parsed styles
+are shared: never modify them.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# local library
+import simplestyle
+from vls460_util import LruCache
+
+STYLE_CACHE = 4096 # distinct style strings kept
+COLOR_CACHE = 1024 # distinct color strings kept
+
+styles = LruCache(STYLE_CACHE)
+colors = LruCache(COLOR_CACHE)
+MISSING = object()
+
+def parse_style(s):
+    style = styles.get(s)
+    if style is None:
+        style = simplestyle.parseStyle(s)
+        styles.put(s, style)
+    return style
+
+def colorref(value):
+    # GDI COLORREF of a stroke or fill value, None for none and url(...)
+    color = colors.get(value, MISSING)
+    if color is MISSING:
+        color = None
+        if value and value != 'none' and value[0:3] != 'url':
+            rgb = simplestyle.parseColor(value)
+            color = rgb[0] + 256*rgb[1] + 256*256*rgb[2]
+        colors.put(value, color)
+    return color
+
+class StyleStack():
+    # styles of the open groups, the innermost last
+
+    def __init__(self, layers=None):
+        self.layers = layers if layers is not None else []
+
+    def push(self, style):
+        self.layers.append(style)
+
+    def pop(self):
+        self.layers.pop()
+
+    def copy(self):
+        return StyleStack(list(self.layers))
+
+    def get(self, key, style=None):
+        # value of key in style, else in the innermost group that sets it
+        if style and key in style:
+            return style[key]
+        for layer in reversed(self.layers):
+            if key in layer:
+                return layer[key]
+        return None
+
+    def key(self, names):
+        # the inherited values of names, e.g. to cache what depends on them
+        return tuple(self.get(name) for name in names)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
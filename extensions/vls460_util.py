@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+vls460_util.py
+Helpers shared by the vls460 modules, with no dependency on them.
+
+Copyright (C) 2020 SCRIPT@Paris Diderot, inge@script.univ-paris-diderot.fr
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+# standard library
+from collections import OrderedDict
+import os
+
+def replace(src, dst):
+    # os.rename() does not overwrite on Windows
+    if os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+class LruCache():
+    # bounded mapping: once full, the least recently used entry is dropped
+    # and handed to ondrop(key, value), e.g. to release a GDI handle
+
+    def __init__(self, size, ondrop=None):
+        self.size = size
+        self.ondrop = ondrop
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            return default
+        self.items[key] = value # most recently used goes last
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        self.items[key] = value
+        while len(self.items) > self.size:
+            k, v = self.items.popitem(last=False)
+            if self.ondrop is not None:
+                self.ondrop(k, v)
+
+    def clear(self):
+        while self.items:
+            k, v = self.items.popitem(last=False)
+            if self.ondrop is not None:
+                self.ondrop(k, v)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
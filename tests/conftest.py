@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# The tests import the modules of extensions/ and draw through the
+# RecordingBackend of vls460_gdi, so they run without Inkscape or a printer:
+#     python -m pytest tests
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'extensions'))
+
+from vls460_gdi import GdiPrinter, RecordingBackend
+
+@pytest.fixture
+def backend():
+    return RecordingBackend()
+
+@pytest.fixture
+def printer(backend):
+    printer = GdiPrinter(backend)
+    printer.create_document('test')
+    return printer
+
+def names(backend, start=0):
+    # the GDI functions called, in order
+    return [name for name, args in backend.calls[start:]]
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from conftest import names
+from vls460_batch import ColorBatch
+from vls460_path import CompactPath
+
+WHITE = 0xffffff
+BLACK = 0x000000
+
+def test_fills_keep_their_order(printer, backend):
+    # white rect, black rect, white knock-out on the black one
+    batch = ColorBatch()
+    batch.add(CompactPath.rectangle(0, 0, 100, 100), None, 1, WHITE)
+    batch.add(CompactPath.rectangle(10, 10, 50, 50), None, 1, BLACK)
+    batch.add(CompactPath.rectangle(20, 20, 10, 10), None, 1, WHITE)
+    start = len(backend.calls)
+    batch.flush(printer)
+    assert names(backend, start).count('FillPath') == 3
+    selected = [args[1] for name, args in backend.calls[start:] if name == 'SelectObject']
+    assert selected[0] == selected[2] != selected[1]
+
+def test_runs_of_a_fill_color_are_grouped():
+    drawn = []
+    class Printer():
+        def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+            drawn.append((color, fillcolor, paths))
+    batch = ColorBatch()
+    for name, fillcolor in [('a', WHITE), ('b', WHITE), ('c', BLACK), ('d', WHITE)]:
+        batch.add(name, None, 1, fillcolor)
+    batch.flush(Printer())
+    assert drawn == [(None, WHITE, ['a', 'b']), (None, BLACK, ['c']), (None, WHITE, ['d'])]
+
+def test_strokes_are_grouped_after_the_fills():
+    drawn = []
+    class Printer():
+        def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+            drawn.append((color, stroke, fillcolor, paths))
+    batch = ColorBatch()
+    batch.add('a', 0xff, 1)
+    batch.add('b', 0xff0000, 1, BLACK)
+    batch.add('c', 0xff, 1)
+    batch.add('d', 0xff, 2)
+    assert len(batch) == 4 and batch.paths == 4
+    batch.flush(Printer())
+    assert drawn == [(None, 1, BLACK, ['b']), (0xff, 1, None, ['a', 'c']), (0xff0000, 1, None, ['b']),
+        (0xff, 2, None, ['d'])]
+    assert len(batch) == 0 and batch.paths == 0
+
+def test_passes_rework_each_group():
+    seen = []
+    def prepare(paths, key):
+        seen.append(key)
+        return paths[::-1]
+    drawn = []
+    class Printer():
+        def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+            drawn.append(paths)
+    batch = ColorBatch()
+    batch.passes.append(prepare)
+    batch.add('a', 0xff, 1, WHITE)
+    batch.add('b', 0xff, 1, WHITE)
+    batch.flush(Printer())
+    assert seen == [(None, 1, WHITE), (0xff, 1, None)]
+    assert drawn == [['b', 'a'], ['b', 'a']]
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
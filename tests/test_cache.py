@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from vls460_cache import GeometryCache, shape_key
+from vls460_path import CompactPath
+
+def same(p, q):
+    return (list(p.coords), list(p.kinds), list(p.counts)) == (list(q.coords), list(q.kinds), list(q.counts))
+
+def test_shape_key():
+    mat = [[1, 0, 0], [0, 1, 0]]
+    key = shape_key(('rect', 1, 2, 3, 4), mat, 10.4)
+    assert key == shape_key(('rect', 1, 2, 3, 4), mat, 10.4)
+    assert key != shape_key(('rect', 1, 2, 3, 5), mat, 10.4)
+    assert key != shape_key(('rect', 1, 2, 3, 4), [[2, 0, 0], [0, 1, 0]], 10.4)
+    assert key != shape_key(('rect', 1, 2, 3, 4), mat, 20.8)
+
+def test_round_trip(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    paths = [CompactPath.rectangle(i, i, 10, 10) for i in range(10)]
+    cache = GeometryCache(directory, 1 << 20)
+    for i, p in enumerate(paths):
+        cache.put(shape_key(i, None, 1), p)
+    cache.close()
+
+    cache = GeometryCache(directory, 1 << 20)
+    for i, p in enumerate(paths):
+        assert same(cache.get(shape_key(i, None, 1)), p)
+    assert cache.get(shape_key(10, None, 1)) is None
+    assert (cache.hits, cache.misses) == (10, 1)
+    cache.close()
+
+def test_a_shape_is_written_once_per_run(tmpdir):
+    p = CompactPath.rectangle(0, 0, 10, 10)
+    cache = GeometryCache(str(tmpdir), 1 << 20)
+    key = shape_key(1, None, 1)
+    for i in range(5):
+        assert cache.get(key) is None
+        cache.put(key, p)
+    size = cache.end
+    cache.put(shape_key(2, None, 1), p)
+    assert cache.end == 2 * size
+    cache.close()
+    cache = GeometryCache(str(tmpdir), 1 << 20)
+    assert same(cache.get(key), p)
+    cache.close()
+
+def test_eviction_keeps_the_last_used(tmpdir):
+    directory = str(tmpdir)
+    p = CompactPath.rectangle(0, 0, 10, 10)
+    cache = GeometryCache(directory, 1 << 20)
+    for i in range(100):
+        cache.put(shape_key(i, None, 1), p)
+    size = cache.end
+    cache.close()
+
+    cache = GeometryCache(directory, size // 2)
+    assert cache.get(shape_key(99, None, 1)) is not None
+    cache.close()
+    cache = GeometryCache(directory, size // 2)
+    assert len(cache.index) <= 100 * 3 // 8
+    assert same(cache.get(shape_key(99, None, 1)), p)
+    cache.close()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
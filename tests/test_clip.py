@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from vls460_clip import clip_path, contains, liang_barsky, overlaps, read_page
+from vls460_path import CompactPath, LINE
+
+BOX = (0, 0, 100, 100)
+
+def nodes(p):
+    return [[tuple(node[1]) for node in sub] for sub in p]
+
+def test_read_page():
+    assert read_page('[Settings]\nPageWidth=6096\nPageHeight = 3048\n') == (609.6, 304.8)
+    assert read_page('PageWidth=6096\n') is None
+    assert read_page('PageWidth=wide\nPageHeight=3048\n') is None
+
+def test_boxes():
+    assert overlaps(BOX, (100, 100, 120, 120)) # touching
+    assert not overlaps(BOX, (101, 0, 120, 10))
+    assert contains(BOX, (0, 0, 100, 100))
+    assert not contains(BOX, (-1, 0, 50, 50))
+
+@pytest.mark.parametrize('segment, expected', [
+    ((10, 10, 90, 90), (0.0, 1.0)),
+    ((-50, 50, 150, 50), (0.25, 0.75)),
+    ((0, 0, 100, 0), (0.0, 1.0)), # on the border
+    ((101, 0, 101, 100), None),
+    ((-10, 50, -10, 50), None), # a point outside
+    ((150, 50, 120, 80), None),
+])
+def test_liang_barsky(segment, expected):
+    assert liang_barsky(*(segment + (BOX,))) == expected
+
+def test_inside_is_kept():
+    p = CompactPath.polyline([10, 10, 20, 20, 30, 10])
+    assert nodes(clip_path(p, BOX, 0.1)) == nodes(p)
+
+def test_crossing_lines_are_cut():
+    p = CompactPath.polyline([-50, 50, 50, 50, 50, 150, 150, 150, 150, 50, 80, 50])
+    assert nodes(clip_path(p, BOX, 0.1)) == [[(0, 50), (50, 50), (50, 100)], [(100, 50), (80, 50)]]
+
+def test_subpaths_outside_are_dropped():
+    p = CompactPath.polyline([10, 10, 20, 20])
+    p.coords.extend((200, 200, 300, 300))
+    p.kinds.append(LINE)
+    p.counts.append(1)
+    clipped = clip_path(p, BOX, 0.1)
+    assert nodes(clipped) == [[(10, 10), (20, 20)]]
+    assert list(clipped.counts) == [1]
+
+def test_crossing_curves_are_flattened():
+    p = CompactPath()
+    p.coords.extend((50.0, 50.0))
+    p.add_curve((50.0, 150.0), (150.0, 150.0), (150.0, 50.0))
+    p.counts.append(1)
+    clipped = clip_path(p, BOX, 0.1)
+    # leaves the page through its bottom, out until its end
+    assert len(clipped.counts) == 1
+    assert all(kind == LINE for kind in clipped.kinds)
+    assert tuple(clipped.coords[:2]) == (50, 50)
+    assert clipped.coords[-1] == pytest.approx(100)
+    assert contains(BOX, clipped.bounds())
+
+def test_curves_inside_are_kept():
+    p = CompactPath()
+    p.coords.extend((10.0, 10.0))
+    p.add_curve((10.0, 90.0), (90.0, 90.0), (90.0, 10.0))
+    p.counts.append(1)
+    clipped = clip_path(p, BOX, 0.1)
+    assert list(clipped.coords) == list(p.coords)
+    assert list(clipped.kinds) == list(p.kinds)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import os
+import stat
+
+import pytest
+
+import vls460_daemon
+from conftest import names
+from vls460_daemon import PrintDaemon, in_spool, read_authkey, spool_file
+from vls460_job import JobWriter
+from vls460_path import CompactPath
+
+@pytest.fixture
+def spool(tmpdir, monkeypatch):
+    directory = str(tmpdir.join('spool'))
+    monkeypatch.setattr(vls460_daemon, 'SPOOL_DIR', directory)
+    return directory
+
+@pytest.fixture
+def daemon(printer, backend):
+    printer.end_document()
+    del backend.calls[:]
+    return PrintDaemon(printer)
+
+def write_job(filename, printer):
+    writer = JobWriter(filename, printer.devmode)
+    writer.create_document('job')
+    writer.draw_path(CompactPath.rectangle(0, 0, 10, 10), 0xff, 1)
+    writer.close()
+
+def run(daemon, filename, delete):
+    id = daemon.submit(filename, delete)
+    daemon.queue.put(None)
+    daemon.run()
+    return daemon.status(id)
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX modes')
+def test_authkey(tmpdir):
+    filename = str(tmpdir.join('keys', 'daemon.key'))
+    key = read_authkey(filename)
+    assert len(key) == vls460_daemon.KEY_SIZE
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o600
+    assert read_authkey(filename) == key
+    with open(filename, 'wb') as fh:
+        fh.write(b'short')
+    assert read_authkey(filename) not in (key, b'short')
+
+def test_in_spool(spool):
+    filename = spool_file()
+    assert os.path.dirname(filename) == spool
+    assert in_spool(filename)
+    assert not in_spool(os.path.join(spool, '..', 'other.vlsjob'))
+    assert not in_spool(spool + '-other')
+
+def test_job_is_printed(spool, daemon, backend):
+    filename = spool_file()
+    write_job(filename, daemon.printer)
+    job = run(daemon, filename, True)
+    assert job['state'] == 'done' and job['name'] == b'job'
+    assert names(backend)[-2:] == ['EndDoc', 'DeleteDC']
+    assert 'PolyPolyline' in names(backend) or 'PolylineTo' in names(backend)
+    assert not os.path.exists(filename)
+
+def test_files_out_of_the_spool_are_kept(spool, daemon, tmpdir):
+    filename = str(tmpdir.join('mine.vlsjob'))
+    write_job(filename, daemon.printer)
+    assert run(daemon, filename, True)['state'] == 'done'
+    assert os.path.exists(filename)
+    # not even read when it is no job
+    other = tmpdir.join('notes.txt')
+    other.write('not a job')
+    job = run(daemon, str(other), True)
+    assert job['state'] == 'failed' and 'not a VLS460 job' in job['error']
+    assert other.check()
+
+def test_failed_job_is_aborted(spool, daemon, backend):
+    filename = spool_file()
+    write_job(filename, daemon.printer)
+    with open(filename, 'ab') as fh:
+        fh.write(b'\x01\0\0') # a truncated record
+    job = run(daemon, filename, True)
+    assert job['state'] == 'failed' and job['error'] == 'truncated job file'
+    assert names(backend)[-2:] == ['AbortDoc', 'DeleteDC']
+    assert 'EndDoc' not in names(backend)
+    assert not os.path.exists(filename)
+
+def test_devmode_of_the_job(spool, daemon):
+    # the settings of each job, the ones of the profile when they do not fit
+    devmode = daemon.printer.devmode[:-1] + b'\x01'
+    filename = spool_file()
+    writer = JobWriter(filename, devmode)
+    writer.create_document('job')
+    writer.close()
+    assert run(daemon, filename, False)['state'] == 'done'
+    assert daemon.printer.devmode == devmode
+    writer = JobWriter(filename, daemon.devmode[:60])
+    writer.create_document('job')
+    writer.close()
+    assert run(daemon, filename, False)['state'] == 'done'
+    assert daemon.printer.devmode == daemon.devmode
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
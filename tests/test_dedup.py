@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from vls460_dedup import remove_duplicates
+from vls460_path import CompactPath, EllipsePath
+
+def polylines(paths):
+    return [[tuple(node[1]) for node in sub] for p in paths for sub in p]
+
+def test_shared_edge_is_cut_once():
+    a = CompactPath.rectangle(0, 0, 10, 10)
+    b = CompactPath.rectangle(10, 0, 10, 10)
+    kept, saved = remove_duplicates([a, b])
+    assert saved == pytest.approx(10)
+    assert polylines(kept) == [
+        [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)],
+        [(10, 0), (20, 0), (20, 10), (10, 10)]]
+
+def test_points_are_not_snapped():
+    # the keys are snapped to whole pixels, the points kept as they are
+    a = CompactPath.polyline([0.2, 0.4, 10.3, 0.4])
+    b = CompactPath.polyline([5.1, 0.3, 20.4, 0.3, 20.4, 7.6])
+    kept, saved = remove_duplicates([a, b])
+    assert polylines(kept)[0] == [(0.2, 0.4), (10.3, 0.4)]
+    start, end, corner = polylines(kept)[1]
+    assert start[0] == pytest.approx(10.1, abs=0.5) and start[1] == 0.3
+    assert (end, corner) == ((20.4, 0.3), (20.4, 7.6))
+
+def test_curves_are_dropped_in_either_direction():
+    p = CompactPath()
+    p.coords.extend((0.0, 0.0))
+    p.add_curve((1.0, 5.0), (4.0, 5.0), (5.0, 0.0))
+    p.counts.append(1)
+    q = CompactPath()
+    q.coords.extend((5.0, 0.0))
+    q.add_curve((4.0, 5.0), (1.0, 5.0), (0.0, 0.0))
+    q.counts.append(1)
+    kept, saved = remove_duplicates([p, q])
+    assert len(polylines(kept)) == 1
+    assert saved > 5
+
+def test_whole_ellipses_stay_ellipses():
+    e = EllipsePath.centered(50, 50, 10, 5)
+    kept, saved = remove_duplicates([CompactPath.rectangle(0, 0, 10, 10), e, e.copy()])
+    assert kept[1] is e
+    assert len(kept) == 2 and saved > 0
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
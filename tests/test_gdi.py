@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+
+from conftest import names
+from vls460_gdi import GdiPrinter, RecordingBackend
+from vls460_path import CompactPath, EllipsePath
+from vls460_stats import CountingBackend
+
+def test_overlapping_fills_of_a_color_are_filled_one_by_one(printer, backend):
+    # in a single path bracket, ALTERNATE would leave the overlap unfilled
+    start = len(backend.calls)
+    a = CompactPath.rectangle(0, 0, 10, 10)
+    b = CompactPath.rectangle(5, 5, 10, 10)
+    printer.draw_paths([a, b], None, 1, 0xff0000)
+    calls = [name for name in names(backend, start) if name.endswith('Path')]
+    assert calls == ['BeginPath', 'EndPath', 'FillPath']*2
+    assert names(backend, start).count('CreateBrushIndirect') == 1
+
+def test_strokes_of_a_color_share_their_calls(printer, backend):
+    start = len(backend.calls)
+    printer.draw_paths([CompactPath.rectangle(0, 0, 1, 1), CompactPath.rectangle(5, 5, 1, 1)], 0, 1, None)
+    assert names(backend, start) == ['CreatePen', 'SelectObject', 'PolyPolyline']
+
+def test_ellipses_use_the_gdi_primitives(printer, backend):
+    start = len(backend.calls)
+    printer.draw_path(EllipsePath.centered(10, 10, 5, 5), 0, 1, 0xff)
+    drawn = names(backend, start)
+    assert 'Arc' in drawn and 'Ellipse' in drawn and 'PolyBezierTo' not in drawn
+
+def test_counted_calls_match_the_backend():
+    backend = RecordingBackend(log=False)
+    counts = Counter()
+    printer = GdiPrinter(CountingBackend(backend, counts))
+    printer.create_document('test')
+    curve = CompactPath()
+    curve.coords.extend((0.0, 0.0))
+    curve.add_curve((1.0, 1.0), (2.0, 1.0), (3.0, 0.0))
+    curve.add_lines([(3.0, 0.0), (4.0, 4.0)], False)
+    curve.counts.append(2)
+    for color in range(3):
+        printer.draw_path(CompactPath.rectangle(0, 0, 10, 10), color, 1, 0xff)
+        printer.draw_path(EllipsePath.centered(5, 5, 3, 2), 1, 1, 2)
+        printer.draw_path(curve, 1, 1, None)
+    printer.draw_paths([curve, EllipsePath.centered(5, 5, 3, 2)], 5, 1, None)
+    printer.draw_band(0, 0, 8, 1, b'\0'*4)
+    printer.close()
+    assert dict(counts) == backend.counts
+    assert counts['Ellipse'] == 3 and counts['FillPath'] == 6
+
+def test_abort_document(printer, backend):
+    printer.abort_document()
+    assert names(backend)[-2:] == ['AbortDoc', 'DeleteDC']
+
+def test_set_devmode_checks_the_size(printer):
+    assert not printer.set_devmode(printer.devmode[:-1])
+    assert printer.set_devmode(printer.devmode)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from conftest import names
+from vls460_gdi import GdiPrinter, RecordingBackend
+from vls460_job import JOB_HEADER, JobReader, JobWriter, replay
+from vls460_path import CompactPath, EllipsePath
+
+def comparable(backend):
+    # the calls with their plain arguments, the handles and ctypes
+    # references differ from a run to the other
+    return [(name, [arg for arg in args if isinstance(arg, (list, bytes))]) for name, args in backend.calls]
+
+def draw(printer):
+    curve = CompactPath()
+    curve.coords.extend((10.0, 10.0))
+    curve.add_curve((10.0, 90.0), (90.0, 90.0), (90.0, 10.0))
+    curve.counts.append(1)
+    printer.draw_path(CompactPath.polyline([0, 0, 100, 0, 100, 50]), 0xff0000, 1)
+    printer.draw_paths([CompactPath.rectangle(0, 0, 40, 40), CompactPath.rectangle(20, 20, 40, 40)],
+        None, 1, 0x000000)
+    printer.draw_paths([curve, CompactPath.polyline([5, 5, 6, 6])], 0x0000ff, 2)
+    printer.draw_path(CompactPath.rectangle(50, 50, 20, 10), 0xff0000, 1, 0x00ff00)
+    # the ellipses go out as such, between the runs of the other paths
+    printer.draw_path(EllipsePath.centered(50.4, 50, 20, 10.6), 0xff0000, 1, 0x00ff00)
+    printer.draw_paths([CompactPath.polyline([0, 0, 9, 9]), EllipsePath.centered(30, 30, 5, 5),
+        CompactPath.polyline([1, 1, 8, 8]), CompactPath.polyline([2, 2, 7, 7])], 0xff0000, 1)
+    printer.draw_paths([EllipsePath.centered(30, 30, 5, 5), CompactPath.rectangle(0, 0, 9, 9)],
+        None, 1, 0x00ff00)
+    skewed = EllipsePath.centered(30, 30, 5, 5)
+    skewed.transform([[1, 0.5, 0], [0, 1, 0]])
+    printer.draw_path(skewed, 0xff0000, 1)
+    printer.draw_band(0, 100, 64, 2, b'\xf0' * 16)
+
+def write_job(filename, printer):
+    writer = JobWriter(filename, printer.devmode, b'[Settings]\n')
+    writer.create_document('job')
+    draw(writer)
+    writer.close()
+
+def test_replay_draws_the_same(tmpdir, printer, backend):
+    filename = str(tmpdir.join('test.vlsjob'))
+    write_job(filename, printer)
+    start = len(backend.calls)
+    draw(printer)
+    direct = comparable(backend)[start:]
+
+    replayed = RecordingBackend()
+    other = GdiPrinter(replayed)
+    job = JobReader(filename)
+    assert job.docname == b'job' and job.las == b'[Settings]\n'
+    assert job.devmode == printer.devmode
+    other.create_document(job.docname)
+    start = len(replayed.calls)
+    replay(job, other)
+    job.close()
+    assert comparable(replayed)[start:] == direct
+    replayed = names(replayed)
+    assert 'StretchDIBits' in replayed
+    assert (replayed.count('Arc'), replayed.count('Ellipse')) == (2, 2)
+
+def test_other_files_are_refused(tmpdir):
+    filename = tmpdir.join('drawing.svg')
+    filename.write_binary(b'<svg/>' + b'\0' * 32)
+    with pytest.raises(ValueError, match='not a VLS460 job'):
+        JobReader(str(filename))
+
+def test_other_version_is_refused(tmpdir, printer):
+    filename = str(tmpdir.join('test.vlsjob'))
+    write_job(filename, printer)
+    with open(filename, 'r+b') as fh:
+        fh.seek(8)
+        fh.write(JOB_HEADER.pack(99, 0, 0, 0)[:2])
+    with pytest.raises(ValueError, match='format 99'):
+        JobReader(filename)
+
+def test_truncated_job(tmpdir, printer):
+    filename = tmpdir.join('test.vlsjob')
+    write_job(str(filename), printer)
+    data = filename.read_binary()
+    filename.write_binary(data[:-5])
+    job = JobReader(str(filename))
+    with pytest.raises(ValueError, match='truncated'):
+        list(job)
+    job.close()
+    filename.write_binary(data[:20])
+    with pytest.raises(ValueError, match='truncated'):
+        JobReader(str(filename))
+
+def test_unknown_record(tmpdir, printer):
+    filename = tmpdir.join('test.vlsjob')
+    write_job(str(filename), printer)
+    filename.write_binary(filename.read_binary() + b'\x07')
+    job = JobReader(str(filename))
+    with pytest.raises(ValueError, match='unknown job record 7'):
+        list(job)
+    job.close()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
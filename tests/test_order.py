@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import random
+
+from vls460_order import flatten, optimize_travel, order_inside_first, travel_length
+from vls460_path import CompactPath, EllipsePath
+
+def segments(paths):
+    # the drawn segments, whatever their order and direction
+    found = []
+    for p in paths:
+        for sub in p:
+            for a, b in zip(sub, sub[1:]):
+                segment = (tuple(a[1]), tuple(a[2]), tuple(b[0]), tuple(b[1]))
+                found.append(min(segment, segment[::-1]))
+    return sorted(found)
+
+def lines(n, seed=1):
+    rnd = random.Random(seed)
+    return [CompactPath.polyline([rnd.uniform(0, 1000) for i in range(6)]) for k in range(n)]
+
+def test_optimize_travel_shortens_the_moves():
+    paths = lines(200)
+    ordered, before, after = optimize_travel(paths)
+    assert before == travel_length(flatten(paths))
+    assert after == travel_length(flatten(ordered))
+    assert after < before / 2
+    assert segments(ordered) == segments(paths)
+
+def test_open_subpaths_are_reversed():
+    far = CompactPath.polyline([100, 0, 10, 0])
+    ordered, before, after = optimize_travel([far, CompactPath.polyline([200, 0, 300, 0])])
+    assert list(ordered[0].coords)[:4] == [10, 0, 100, 0]
+    assert after < before
+
+def test_closed_subpaths_start_at_the_nearest_node():
+    square = CompactPath.polyline([100, 100, 110, 100, 110, 110, 100, 110], closed=True)
+    ordered, before, after = optimize_travel([CompactPath.polyline([120, 120, 115, 115]), square],
+        origin=(130, 130))
+    sub = list(ordered[0])[1]
+    assert sub[0][1] == sub[-1][1] == [110, 110]
+
+def test_ellipses_are_kept_whole():
+    e = EllipsePath.centered(500, 500, 10, 10)
+    ordered, before, after = optimize_travel(lines(20) + [e])
+    assert any(p is e for p in ordered)
+
+def test_holes_before_their_contour():
+    outer = CompactPath.rectangle(0, 0, 100, 100)
+    hole = CompactPath.rectangle(40, 40, 10, 10)
+    inner = CompactPath.rectangle(42, 42, 2, 2) # a part inside the hole
+    away = CompactPath.rectangle(200, 0, 10, 10)
+    for optimize in (False, True):
+        ordered, before, after = order_inside_first([outer, away, hole, inner], optimize=optimize)
+        boxes = [sub.box() for sub in flatten(ordered)]
+        assert boxes.index(inner.bounds()) < boxes.index(hole.bounds()) < boxes.index(outer.bounds())
+        assert len(boxes) == 4
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
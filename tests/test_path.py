@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import pickle
+
+import pytest
+
+from vls460_path import CURVE, LINE, CompactPath, EllipsePath, Subpath
+
+def curved():
+    # a curve then a line, open
+    p = CompactPath()
+    p.coords.extend((0.0, 0.0))
+    p.add_curve((1.0, 2.0), (3.0, 2.0), (4.0, 0.0))
+    p.add_lines([(4.0, 0.0), (6.0, 0.0)], False)
+    p.counts.append(2)
+    return p
+
+def test_rectangle():
+    p = CompactPath.rectangle(1, 2, 3, 4)
+    assert len(p) == 1
+    assert p.points() == 5
+    assert list(p.kinds) == [LINE]*4
+    assert p.bounds() == (1, 2, 4, 6)
+
+def test_polyline_closed():
+    p = CompactPath.polyline([0, 0, 10, 0, 10, 10], closed=True)
+    assert list(p.coords) == [0, 0, 10, 0, 10, 10, 0, 0]
+    assert list(p.counts) == [3]
+    assert len(CompactPath.polyline([5, 5])) == 0
+
+def test_superpath_round_trip():
+    p = curved()
+    q = CompactPath.from_superpath(list(p))
+    assert list(q.coords) == list(p.coords)
+    assert list(q.kinds) == [CURVE, LINE]
+    assert list(q.counts) == [2]
+
+def test_bounds_hold_the_control_points():
+    assert curved().bounds() == (0, 0, 6, 2)
+    assert CompactPath().bounds() is None
+
+def test_transform_and_rounded():
+    p = CompactPath.rectangle(0, 0, 1, 1)
+    p.transform([[2.0, 0.0, 10.0], [0.0, 3.0, 0.4]])
+    assert list(p.rounded()) == [10, 0, 12, 0, 12, 3, 10, 3, 10, 0]
+
+def test_ellipse_keeps_its_box_while_axis_aligned():
+    e = EllipsePath.centered(10, 10, 4, 2)
+    assert e.box == (6, 8, 14, 12)
+    e.transform([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0]])
+    assert e.box is not None
+    e.transform([[1.0, 0.5, 0.0], [0.0, 1.0, 0.0]])
+    assert e.box is None
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+def test_pickle(protocol):
+    for p in (curved(), EllipsePath.centered(1, 2, 3, 4)):
+        q = pickle.loads(pickle.dumps(p, protocol))
+        assert type(q) is type(p)
+        assert q.__getstate__() == p.__getstate__()
+
+def test_subpath_reversed():
+    p = curved()
+    out = CompactPath()
+    end = Subpath(p, *next(p.subpaths())).append_to(out, flip=True)
+    assert list(out.coords) == [6, 0, 4, 0, 3, 2, 1, 2, 0, 0]
+    assert list(out.kinds) == [LINE, CURVE]
+    assert end == (0, 0)
+
+def test_subpath_rotated():
+    p = CompactPath.polyline([0, 0, 10, 0, 10, 10, 0, 10], closed=True)
+    out = CompactPath()
+    end = Subpath(p, *next(p.subpaths())).append_to(out, segment=2)
+    assert list(out.coords) == [10, 10, 0, 10, 0, 0, 10, 0, 10, 10]
+    assert list(out.counts) == [4]
+    assert end == (10, 10)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
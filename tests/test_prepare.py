@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip('cubicsuperpath') # of the Inkscape 0.92 extensions
+
+from vls460_path import CompactPath, EllipsePath
+from vls460_prepare import ELLIPSE, PATH, POLYGON, POLYLINE, RECT, ShapePool, prepare
+
+MAT = [[2.0, 0.0, 1.0], [0.0, 2.0, -1.0]]
+
+def shapes(n):
+    kinds = [
+        (RECT, (0.0, 0.0, 4.0, 3.0)),
+        (POLYLINE, (0.0, 0.0, 1.0, 1.0, 2.0, 0.0)),
+        (POLYGON, (0.0, 0.0, 1.0, 1.0, 2.0, 0.0)),
+        (ELLIPSE, (5.0, 5.0, 2.0, 1.0)),
+        (PATH, 'M 0,0 C 1,1 2,1 3,0 L 4,4 Z'),
+    ]
+    return [kinds[i % len(kinds)] for i in range(n)]
+
+def arrays(p):
+    return list(p.coords), list(p.kinds), list(p.counts)
+
+def test_prepare():
+    p = prepare((RECT, (1.0, 1.0, 2.0, 2.0)), MAT, 0, False)
+    assert p.bounds() == (3, 1, 7, 5)
+    assert len(prepare((POLYGON, (0.0, 0.0, 1.0, 1.0, 2.0, 0.0)), MAT, 0, False).kinds) == 3
+    e = prepare((ELLIPSE, (5.0, 5.0, 2.0, 1.0)), MAT, 0.1, False)
+    assert isinstance(e, EllipsePath) and e.box == (7, 7, 15, 11)
+
+def test_pool_keeps_the_order():
+    emitted = []
+    def emit(p, index, label):
+        emitted.append((index, label, p))
+    pool = ShapePool(2, 0.1, False, emit, chunk=7)
+    items = shapes(50)
+    for i, shape in enumerate(items):
+        if i % 9 == 0:
+            # already prepared, e.g. from the cache
+            pool.add(CompactPath.rectangle(i, i, 1, 1), None, (i, 'cached'))
+        else:
+            pool.add(shape, MAT, (i, 'prepared'))
+    pool.close()
+    assert [index for index, label, p in emitted] == list(range(50))
+    for index, label, p in emitted:
+        if label == 'cached':
+            assert p.bounds() == (index, index, index + 1, index + 1)
+        else:
+            assert arrays(p) == arrays(prepare(items[index], MAT, 0.1, False))
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
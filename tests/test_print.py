@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# vls460_print needs the Inkscape 0.92 extensions (inkex, simplestyle...) on
+# the path, e.g. run through inkex.cmd
+import pytest
+
+inkex = pytest.importorskip('inkex')
+
+from vls460_print import Vls460Printer
+
+SVG = '''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+   xmlns:xlink="http://www.w3.org/1999/xlink"
+   xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+   width="100mm" height="100mm" viewBox="0 0 100 100"
+   sodipodi:docname="test.svg">
+{}
+</svg>
+'''
+
+def run(tmpdir, body, *args):
+    # the effect as inkex.Effect.affect() runs it, without output
+    filename = str(tmpdir.join('test.svg'))
+    with open(filename, 'w') as fh:
+        fh.write(SVG.format(body))
+    e = Vls460Printer()
+    e.svg_file = filename
+    e.getoptions(['--backend=record'] + list(args) + [filename])
+    e.parse()
+    e.getposinlayer()
+    e.getselected()
+    e.getdocids()
+    e.effect()
+    return e
+
+def counts(e):
+    return e.printer.backend.counts
+
+NESTED_LATER = '''
+<defs>
+  <g id="symbol">
+    <rect id="r1" x="10" y="10" width="5" height="5" style="fill:none;stroke:#ff0000"/>
+    <use id="inner" xlink:href="#later"/>
+  </g>
+</defs>
+<g inkscape:groupmode="layer" id="layer1">
+  <use id="outer" xlink:href="#symbol" transform="translate(20,0)"/>
+</g>
+<g inkscape:groupmode="layer" id="layer2">
+  <rect id="later" x="50" y="50" width="5" height="5" style="fill:none;stroke:#0000ff"/>
+</g>
+'''
+
+@pytest.mark.parametrize('group', ['false', 'true'])
+def test_stream_draws_as_the_document(tmpdir, group):
+    body = ''.join('<g inkscape:groupmode="layer" id="layer{0}">'
+        '<rect id="r{0}" x="{0}" y="{0}" width="5" height="5" style="fill:#000000;stroke:#ff0000"/>'
+        '<path id="p{0}" d="M {0},0 C 10,10 20,10 30,0" style="fill:none;stroke:#0000ff"/></g>'.format(i)
+        for i in range(5))
+    dom = run(tmpdir, body, '--group-colors=' + group)
+    stream = run(tmpdir, body, '--group-colors=' + group, '--stream=true')
+    assert counts(stream) == counts(dom)
+
+def test_stream_waits_for_the_inner_clones(tmpdir):
+    # the clone of layer1 holds a clone of an element read after it
+    dom = run(tmpdir, NESTED_LATER)
+    stream = run(tmpdir, NESTED_LATER, '--stream=true')
+    assert counts(dom)['PolylineTo'] == 3
+    assert counts(stream) == counts(dom)
+    assert stream.not_converted == dom.not_converted == []
+
+def test_stream_clones_of_later_elements(tmpdir):
+    body = '''
+<g inkscape:groupmode="layer" id="layer1">
+  <use id="clone" xlink:href="#later" transform="translate(20,0)"/>
+</g>
+<g inkscape:groupmode="layer" id="layer2">
+  <rect id="later" x="50" y="50" width="5" height="5" style="fill:none;stroke:#0000ff"/>
+</g>
+'''
+    dom = run(tmpdir, body)
+    stream = run(tmpdir, body, '--stream=true')
+    assert counts(stream) == counts(dom)
+    assert counts(dom)['PolylineTo'] == 2
+
+def test_templates_per_group_style(tmpdir):
+    # the rect inherits the stroke of the group around each clone
+    body = '''
+<defs><rect id="s" x="0" y="0" width="5" height="5" style="fill:none"/></defs>
+<g inkscape:groupmode="layer" id="layer1">
+  <g style="stroke:#ff0000"><use id="c1" xlink:href="#s"/><use id="c2" xlink:href="#s" x="10"/></g>
+  <g style="stroke:#0000ff"><use id="c3" xlink:href="#s" x="20"/></g>
+  <g style="stroke:#ff0000"><use id="c4" xlink:href="#c3" y="20"/></g>
+</g>
+'''
+    e = run(tmpdir, body, '--stats-report=' + str(tmpdir.join('report.json')))
+    assert counts(e)['PolylineTo'] == 4
+    assert counts(e)['CreatePen'] == 2
+    assert e.stats.counts['clones'] == 5 # c4 and the clone it refers to
+    assert e.stats.counts['templates'] == 3 # s red, s blue, c3 red
+
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGNgAAAAAgAB'
+    'SK+kcQAAAABJRU5ErkJggg==')
+
+def test_image_lengths(tmpdir):
+    pytest.importorskip('PIL')
+    body = '''
+<g inkscape:groupmode="layer" id="layer1">
+  <image id="mm" x="1mm" y="0" width="10mm" height="10mm" xlink:href="{0}"/>
+  <image id="default" xlink:href="{0}"/>
+  <image id="percent" x="0" y="0" width="50%" height="50%" xlink:href="{0}"/>
+  <image id="broken" width="10" height="10" xlink:href="data:image/png;base64,@@"/>
+</g>
+'''.format(PNG)
+    e = run(tmpdir, body)
+    assert e.not_converted == ['percent', 'broken']
+    assert counts(e)['StretchDIBits'] == 2
+
+def test_culled_shapes_are_reported_apart(tmpdir):
+    body = '''
+<g inkscape:groupmode="layer" id="layer1">
+  <rect id="in" x="10" y="10" width="5" height="5" style="fill:none;stroke:#ff0000"/>
+  <rect id="off" x="80" y="80" width="5" height="5" style="fill:none;stroke:#ff0000"/>
+  <g id="twice">
+    <rect id="off1" x="70" y="10" width="5" height="5" style="fill:none;stroke:#ff0000"/>
+    <rect id="off2" x="70" y="20" width="5" height="5" style="fill:none;stroke:#ff0000"/>
+  </g>
+  <use id="clone" xlink:href="#twice" transform="translate(1,0)"/>
+  <path id="empty" d="" style="stroke:#ff0000"/>
+</g>
+'''
+    e = run(tmpdir, body, '--page-width=50', '--page-height=50')
+    assert e.culled == 5
+    assert list(e.culled_ids) == ['off', 'off1', 'off2', 'clone']
+    assert e.not_converted == ['empty']
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
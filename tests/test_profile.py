@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+
+from vls460_gdi import DM_IN_PROMPT, GdiPrinter, RecordingBackend
+from vls460_profile import PrinterProfile
+from vls460_util import LruCache
+
+def prompts(backend):
+    # the printer properties dialogs shown
+    return [args for name, args in backend.calls
+            if name == 'DocumentPropertiesA' and args[5] & DM_IN_PROMPT]
+
+def test_a_new_profile_has_no_settings(tmpdir):
+    profile = PrinterProfile('new', str(tmpdir))
+    assert profile.devmode is None and profile.las == b''
+    assert not profile.load()
+
+def test_settings_are_saved_and_reloaded(tmpdir):
+    profile = PrinterProfile('wood 3mm', str(tmpdir.join('profiles')))
+    profile.devmode = b'\0\x01\xff' * 10
+    profile.las = b'[pen1]\nspeed=20\n'
+    profile.save()
+    assert os.path.basename(profile.filename) == 'wood_3mm.json'
+    assert tmpdir.join('profiles').listdir() == [tmpdir.join('profiles', 'wood_3mm.json')]
+    reloaded = PrinterProfile('wood 3mm', str(tmpdir.join('profiles')))
+    assert reloaded.devmode == profile.devmode and reloaded.las == profile.las
+
+def test_names_stay_in_the_directory(tmpdir):
+    profile = PrinterProfile('../a/b', str(tmpdir))
+    assert os.path.dirname(profile.filename) == str(tmpdir)
+
+def test_corrupt_profiles_are_ignored(tmpdir):
+    tmpdir.join('broken.json').write('{"devmode": ')
+    profile = PrinterProfile('broken', str(tmpdir))
+    assert not profile.load() and profile.devmode is None
+
+def test_saved_settings_skip_the_dialog():
+    backend = RecordingBackend()
+    devmode = GdiPrinter(backend).devmode
+    assert len(prompts(backend)) == 1
+    backend = RecordingBackend()
+    assert GdiPrinter(backend, devmode).devmode == devmode
+    assert prompts(backend) == []
+    backend = RecordingBackend()
+    GdiPrinter(backend, devmode, prompt=True)
+    assert len(prompts(backend)) == 1
+
+def test_settings_of_another_driver_show_the_dialog():
+    backend = RecordingBackend()
+    devmode = GdiPrinter(backend).devmode
+    backend = RecordingBackend()
+    assert len(GdiPrinter(backend, devmode[:-1]).devmode) == len(devmode)
+    assert len(prompts(backend)) == 1
+
+def test_lru_cache_drops_the_least_recently_used():
+    dropped = []
+    cache = LruCache(2, lambda k, v: dropped.append(k))
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert dropped == ['b'] and 'a' in cache and len(cache) == 2
+    cache.clear()
+    assert dropped == ['b', 'a', 'c'] and len(cache) == 0
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from vls460_batch import ColorBatch
+from vls460_progress import ProgressLog
+from vls460_path import CompactPath
+
+def lines(filename):
+    with open(filename) as fh:
+        return fh.read().splitlines()
+
+def test_resume_skips_the_shapes_sent(tmpdir):
+    filename = str(tmpdir.join('logs', 'job.log'))
+    shapes = [CompactPath.rectangle(i, 0, 10, 10) for i in range(3)]
+    log = ProgressLog(filename, 'drawing.svg')
+    entries = [log.entry('rect{}'.format(i), p, None) for i, p in enumerate(shapes)]
+    # two identical shapes of the same id, e.g. the same clone
+    entries.append(entries[2])
+    for entry in entries[:3]:
+        log.sent(entry)
+    log.close()
+
+    log = ProgressLog(filename, 'drawing.svg', resume=True)
+    assert log.mismatch is None
+    assert [log.skip(entry) for entry in entries] == [True, True, True, False]
+    log.sent(entries[3])
+    log.close()
+    assert lines(filename) == ['# drawing.svg'] + entries
+
+def test_log_of_another_document(tmpdir):
+    filename = str(tmpdir.join('job.log'))
+    ProgressLog(filename, 'drawing.svg').close()
+    log = ProgressLog(filename, u'other drawing é.svg', resume=True)
+    assert log.mismatch == 'drawing.svg'
+    log.close()
+
+class Drawn():
+
+    def __init__(self, log):
+        self.log = log
+        self.drawn = []
+
+    def draw_paths(self, paths, color=None, stroke=1, fillcolor=None):
+        self.drawn.append((color, fillcolor, paths))
+        # the log follows what is drawn
+        self.log.append(None)
+
+def test_order_under_grouping():
+    # a and c red, b filled blue and stroked red, d blue: the log has the
+    # shapes as the printer gets them, after the last group of each one,
+    # the fills being drawn first
+    log = []
+    batch = ColorBatch()
+    batch.sent = log.append
+    for name, color, fillcolor in [('a', 0xff, None), ('b', 0xff, 0xff0000), ('c', 0xff, None),
+            ('d', 0xff0000, None)]:
+        batch.add(name, color, 1, fillcolor, batch.track(name))
+    printer = Drawn(log)
+    batch.flush(printer)
+    assert [paths for color, fillcolor, paths in printer.drawn] == [['b'], ['a', 'b', 'c'], ['d']]
+    assert log == [None, None, 'a', 'b', 'c', None, 'd']
+    assert not batch.entries
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
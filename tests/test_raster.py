@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import base64
+import io
+
+import pytest
+
+import vls460_raster
+from vls460_raster import RasterImage, bayer, can_rasterize, load_image
+
+pytestmark = pytest.mark.skipif(not can_rasterize(), reason='needs PIL and numpy')
+
+def gradient(width, height):
+    from PIL import Image
+    image = Image.new('L', (width, height))
+    image.putdata([(x * 255 // (width - 1) + y) % 256 for y in range(height) for x in range(width)])
+    return image
+
+def data_uri(image):
+    buf = io.BytesIO()
+    image.save(buf, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buf.getvalue()).decode('ascii')
+
+def test_bayer():
+    m = bayer(8)
+    assert m.shape == (8, 8)
+    assert sorted(m.ravel().tolist()) == list(range(64))
+
+def test_load_data_uri():
+    image = load_image(data_uri(gradient(8, 4)))
+    assert image.size == (8, 4)
+
+@pytest.mark.parametrize('href', [
+    'data:image/png;base64,@@not base64',
+    'data:image/png;base64,abc', # bad padding
+    'data:image/png,raw',
+])
+def test_malformed_data_uri(href):
+    with pytest.raises(ValueError):
+        load_image(href)
+
+def test_dib_layout():
+    # 20 pixels: 3 bytes, rows padded to 4 bytes and stored bottom-up
+    from PIL import Image
+    image = Image.new('L', (20, 2), 255)
+    image.putpixel((0, 0), 0)
+    bands = list(RasterImage(image, 5, 7, 20, 2).bands('threshold'))
+    assert len(bands) == 1
+    x, y, width, height, bits = bands[0]
+    assert (x, y, width, height) == (5, 7, 20, 2)
+    assert bits == b'\xff\xff\xf0\x00' + b'\x7f\xff\xf0\x00'
+
+def test_threshold():
+    from PIL import Image
+    image = Image.new('L', (2, 1))
+    image.putdata([127, 128])
+    x, y, width, height, bits = next(RasterImage(image, 0, 0, 2, 1).bands('threshold'))
+    assert bits == b'\x40\0\0\0'
+
+@pytest.mark.parametrize('dither', ['ordered', 'diffusion'])
+def test_bands_dither_as_a_whole(monkeypatch, dither):
+    image = RasterImage(gradient(50, 30), 0, 0, 97, 61)
+    whole = list(image.bands(dither))
+    assert len(whole) == 1
+    monkeypatch.setattr(vls460_raster, 'BAND_PIXELS', 97 * 8)
+    bands = list(image.bands(dither))
+    assert len(bands) == 8
+    assert [band[3] for band in bands] == [8] * 7 + [5]
+    # bottom-up bands, glued back top-down
+    stride = len(whole[0][4]) // 61
+    rows = []
+    for x, y, width, height, bits in bands:
+        assert y == len(rows)
+        rows.extend(bits[i:i + stride] for i in range(0, len(bits), stride)[::-1])
+    assert b''.join(rows[::-1]) == whole[0][4]
+
+def test_diffusion_keeps_the_gray_level():
+    from PIL import Image
+    image = RasterImage(Image.new('L', (64, 64), 64), 0, 0, 64, 64)
+    x, y, width, height, bits = next(image.bands('diffusion'))
+    white = sum(bin(b).count('1') for b in bytearray(bits))
+    assert white == pytest.approx(64 * 64 / 4.0, rel=0.05)
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
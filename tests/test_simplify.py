@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from conftest import names
+from vls460_path import (CURVE, LINE, CompactPath, EllipsePath, douglas_peucker, flatten_curve,
+    segment_distance)
+
+def curve(p0, c1, c2, p1):
+    p = CompactPath()
+    p.coords.extend(p0)
+    p.add_curve(c1, c2, p1)
+    p.counts.append(1)
+    return p
+
+def bezier(p0, c1, c2, p1, t):
+    u = 1 - t
+    return tuple(u**3*a + 3*u*u*t*b + 3*u*t*t*c + t**3*d for a, b, c, d in zip(p0, c1, c2, p1))
+
+def test_douglas_peucker():
+    points = [(0, 0), (1, 0.01), (2, -0.01), (3, 0), (3, 5)]
+    assert douglas_peucker(points, 0.1) == [(0, 0), (3, 0), (3, 5)]
+    assert douglas_peucker(points, 0.001) == points
+    assert douglas_peucker(points[:2], 10) == points[:2]
+
+def test_nearly_straight_curves_become_lines():
+    p = curve((0.0, 0.0), (3.0, 0.05), (6.0, -0.05), (10.0, 0.0))
+    simple = p.simplify(0.1)
+    assert list(simple.kinds) == [LINE]
+    assert list(simple.coords) == [0, 0, 10, 0]
+    assert list(simple.counts) == [1]
+
+def test_curves_are_kept_unless_flattened():
+    p = curve((0.0, 0.0), (0.0, 10.0), (10.0, 10.0), (10.0, 0.0))
+    p.add_lines([(10.0, 0.0), (15.0, 0.0), (20.0, 0.0)], False)
+    p.counts[0] = 3
+    simple = p.simplify(0.1)
+    # the collinear line points are thinned out
+    assert list(simple.kinds) == [CURVE, LINE]
+    assert list(simple.coords[-2:]) == [20, 0]
+    flat = p.simplify(0.1, flatten=True)
+    assert CURVE not in flat.kinds and len(flat.kinds) > 4
+    assert list(flat.counts) == [len(flat.kinds)]
+
+def test_flattened_curves_stay_within_the_tolerance():
+    p0, c1, c2, p1 = (0.0, 0.0), (0.0, 100.0), (100.0, 100.0), (100.0, 0.0)
+    points = [p0] + flatten_curve(p0, c1, c2, p1, 0.5)
+    assert points[-1] == p1
+    for i in range(101):
+        point = bezier(p0, c1, c2, p1, i / 100.0)
+        assert min(segment_distance(point, a, b) for a, b in zip(points, points[1:])) <= 0.5
+
+def test_ellipses_stay_ellipses():
+    e = EllipsePath.centered(10, 10, 5, 5)
+    assert e.simplify(0.1) is e
+    flat = e.simplify(0.1, flatten=True)
+    assert not isinstance(flat, EllipsePath) and CURVE not in flat.kinds
+
+def test_straight_runs_go_out_as_polylines(printer, backend):
+    p = curve((0.0, 0.0), (0.0, 10.0), (10.0, 10.0), (10.0, 0.0))
+    p.add_lines([(10.0, 0.0), (20.0, 0.0), (20.0, 20.0)], False)
+    p.counts[0] = 3
+    start = len(backend.calls)
+    printer.draw_path(p, 0, 1)
+    assert names(backend, start)[-3:] == ['MoveToEx', 'PolyBezierTo', 'PolylineTo']
+    start = len(backend.calls)
+    printer.draw_paths([CompactPath.polyline([0, 0, 5, 5, 9, 0]), CompactPath.rectangle(0, 0, 3, 3)], 0, 1)
+    assert names(backend, start) == ['PolyPolyline']
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from vls460_estimate import (JobEstimate, MAX_SPEED, PEN_COLORS, clock, measure, pen_of,
+    raster_bands, read_las)
+from vls460_gdi import GdiPrinter, RecordingBackend
+from vls460_path import CompactPath, LINE
+from vls460_stats import Stats
+
+def test_phases_and_timers(tmpdir):
+    stats = Stats()
+    start = stats.start()
+    stats.stop('parse', start)
+    timer = stats.timer('emit')
+    assert stats.timer('emit') is timer
+    for i in range(3):
+        start = timer.start()
+        timer.stop(start)
+    stats.count('shapes', 2)
+    stats.count('shapes')
+    stats.gdi['PolylineTo'] += 4
+    filename = str(tmpdir.join('report.json'))
+    stats.write(filename, estimate=None)
+    with open(filename) as fh:
+        report = json.load(fh)
+    assert report['phases']['parse']['times'] == 1
+    assert report['phases']['emit']['times'] == 3 and report['phases']['emit']['cpu'] is None
+    assert report['counts'] == {'shapes': 3}
+    assert report['gdi'] == {'PolylineTo': 4}
+    assert 'estimate' in report
+
+def test_printer_times_its_drawing():
+    stats = Stats()
+    printer = GdiPrinter(RecordingBackend(log=False))
+    printer.emit = stats.timer('emit')
+    printer.create_document('test')
+    printer.draw_path(CompactPath.rectangle(0, 0, 10, 10), 0, 1, 0xff)
+    printer.draw_paths([CompactPath.rectangle(0, 0, 10, 10)] * 3, 0, 1)
+    printer.draw_band(0, 0, 8, 1, b'\0'*4)
+    printer.close()
+    assert stats.timers['emit'].times == 3
+
+def test_read_las():
+    pens = read_las('[Pens]\nPenSpeedsCips=100 200 300 400 500 600 700 800\nPenMode=1 2\n')
+    assert pens['PenSpeedsCips'][2] == 300
+    # too short, the default
+    assert pens['PenMode'] == [0]*8
+
+def test_pen_of():
+    assert [pen_of(color) for color in PEN_COLORS] == list(range(8))
+    assert pen_of(0x010101) == 0
+    assert pen_of(0x0000f0) == 1
+
+def test_measure():
+    p = CompactPath.polyline([0, 0, 3, 4, 3, 10])
+    p.coords.extend((10, 10, 20, 10))
+    p.kinds.append(LINE)
+    p.counts.append(1)
+    length, ends = measure(p)
+    assert length == pytest.approx(21)
+    assert ends == [(0, 0, 3, 10), (10, 10, 20, 10)]
+
+def test_raster_bands():
+    # the first two boxes share scan lines
+    assert raster_bands([(0, 0, 10, 10), (20, 5, 30, 20), (0, 30, 5, 40)]) == [(20, 30), (10, 5)]
+    assert raster_bands([]) == []
+
+def test_estimate():
+    # 1000 DPI, pen 0 at 50 % and full speed moves
+    estimate = JobEstimate(1000 / 96.0, 'PenSpeedsCips=500 1000 1000 1000 1000 1000 1000 1000\n')
+    inch = 1000
+    estimate.draw_path(CompactPath.polyline([inch, 0, 2*inch, 0]), 0x000000)
+    estimate.draw_paths([CompactPath.rectangle(0, 0, inch, inch)], None, 1, 0x0000ff)
+    report = estimate.report()
+    black, red = report['pens']
+    assert black['cut'] == pytest.approx(25.4)
+    assert black['travel'] == pytest.approx(25.4)
+    assert black['time'] == pytest.approx(1 / (MAX_SPEED / 2) + 1 / MAX_SPEED)
+    assert red['raster'] == pytest.approx(25.4 * 25.4)
+    assert red['time'] == pytest.approx(inch / MAX_SPEED)
+    assert report['total']['time'] == pytest.approx(black['time'] + red['time'])
+    assert clock(3725.4) == '1:02:05'
+    assert 'total' in estimate.summary()
+
+def test_estimate_hands_over_to_the_printer():
+    backend = RecordingBackend(log=False)
+    estimate = JobEstimate(1000 / 96.0, '', GdiPrinter(backend))
+    estimate.create_document('test')
+    estimate.draw_path(CompactPath.rectangle(0, 0, 10, 10), 0)
+    estimate.close()
+    assert backend.counts['PolylineTo'] == 1 and backend.counts['EndDoc'] == 1
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip('simplestyle') # of the Inkscape 0.92 extensions
+
+from vls460_style import StyleStack, colorref, parse_style
+
+def test_parse_style_is_cached():
+    style = parse_style('fill:none;stroke:#ff0000')
+    assert style == {'fill': 'none', 'stroke': '#ff0000'}
+    assert parse_style('fill:none;stroke:#ff0000') is style
+
+def test_colorref():
+    # COLORREF is 0x00bbggrr
+    assert colorref('#ff0000') == 0x0000ff
+    assert colorref('#0000ff') == 0xff0000
+    assert colorref('#123') == 0x332211
+    assert colorref('none') is None
+    assert colorref('url(#gradient)') is None
+    assert colorref(None) is None
+
+def test_the_innermost_group_wins():
+    stack = StyleStack()
+    stack.push({'stroke': '#ff0000', 'fill': 'none'})
+    stack.push({'stroke': '#0000ff'})
+    assert stack.get('stroke') == '#0000ff'
+    assert stack.get('fill') == 'none'
+    assert stack.get('stroke', {'stroke': '#00ff00'}) == '#00ff00'
+    assert stack.get('stroke-width') is None
+    assert stack.key(('stroke', 'fill', 'stroke-width')) == ('#0000ff', 'none', None)
+    stack.pop()
+    assert stack.get('stroke') == '#ff0000'
+
+def test_copies_do_not_share_their_groups():
+    stack = StyleStack()
+    stack.push({'stroke': '#ff0000'})
+    copy = stack.copy()
+    stack.pop()
+    copy.push({'fill': '#000000'})
+    assert stack.get('stroke') is None
+    assert copy.key(('stroke', 'fill')) == ('#ff0000', '#000000')
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 fileencoding=utf-8 textwidth=99